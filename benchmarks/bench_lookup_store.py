@@ -0,0 +1,62 @@
+# benchmarks/bench_lookup_store.py
+"""
+Build-time and memory benchmark: create_lookup_dict() (dict of lists of
+per-row dicts) versus create_lookup_store() (ColumnarLookup arrays).
+
+Usage:
+    python -m benchmarks.bench_lookup_store [rows] [promotions]
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import config.config as cfg
+from src.utils.lookup import create_lookup_dict, create_lookup_store, lookup_value
+
+
+def make_spms(rows: int, promotions: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic SPMS Report 1 frame with every SPMS_FIELDS column."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'Promotion No': rng.integers(0, promotions, rows)})
+    for i, col in enumerate(cfg.SPMS_FIELDS):
+        if col in ('Expected Qty', 'Dc Operand', 'Expected Cost'):
+            df[col] = rng.random(rows) * 100
+        else:
+            df[col] = [f"{col[:4]}-{v}" for v in rng.integers(0, 500 + 50 * i, rows)]
+    return df
+
+
+def measure(builder, df):
+    """Return (seconds, retained bytes, peak bytes) for builder(df)."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = builder(df, 'Promotion No', cfg.SPMS_FIELDS)
+    seconds = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, current, peak
+
+
+def main(rows: int = 200_000, promotions: int = 2_000):
+    df = make_spms(rows, promotions)
+    print(f"SPMS rows: {rows:,}  promotions: {promotions:,}  fields: {len(cfg.SPMS_FIELDS)}")
+    results = {}
+    for name, builder in (('dict', create_lookup_dict), ('store', create_lookup_store)):
+        lookup, seconds, current, peak = measure(builder, df)
+        t0 = time.perf_counter()
+        for promo in range(promotions):
+            lookup_value(promo, 'Bill To Name', lookup)
+        probe = time.perf_counter() - t0
+        results[name] = lookup
+        print(f"{name:>6}: build {seconds:7.2f}s  retained {current / 2**20:8.1f} MiB  "
+              f"peak {peak / 2**20:8.1f} MiB  {promotions:,} lookup_value calls {probe * 1e3:.1f} ms")
+    for promo in range(0, promotions, max(1, promotions // 50)):
+        assert lookup_value(promo, 'Bill To Name', results['dict']) == \
+            lookup_value(promo, 'Bill To Name', results['store'])
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -14,6 +14,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR   = os.getenv('DATA_DIR', os.path.join(BASE_DIR, 'data'))
 OUTPUT_DIR = os.getenv('OUTPUT_DIR', os.path.join(BASE_DIR, 'output'))
 LOG_DIR    = os.getenv('LOG_DIR', os.path.join(BASE_DIR, 'logs'))
+CACHE_DIR  = os.getenv('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
 
 # ─── INPUT PARTS ──────────────────────────────────────────────────────────────
 # Each tuple is (CONFIG_KEY, Label for GUI)
@@ -89,10 +90,106 @@ SPMS2_FIELDS = [
     'Expected Cost'
 ]
 
+# Per-input load schemas, applied when the sheet is parsed (ExcelSource.read):
+#   required – columns that must exist (the load fails with a report otherwise)
+#   optional – columns kept when present (absent ones are reported)
+#   leading  – number of leading columns always kept, whatever their header
+#   weeks    – also keep every later column whose header is a week label
+#   dtypes   – target dtype per column; the key 'weeks' covers the week columns
+#   project  – False: check/report the columns but load the whole sheet
+#              (for inputs that are also exported as-is)
+# Otherwise only the columns listed (plus leading/week columns) are loaded.
+# Closed orders and trackers are projected by their own readers
+# (streamed columns / TRACKER_COLUMN_ALIASES).
+# Repeated SPMS text (names, codes, flags) loads as category and quantities as
+# nullable Int32; amounts stay float64 (float32 rounding shows in exported cents).
+SPMS_DTYPES = {
+    'Bill To Name':          'category',
+    'Product Code':          'category',
+    'Cancel Flag':           'category',
+    'Recreate Flag':         'category',
+    'Claim Line Flag':       'category',
+    'Promotion Status Code': 'category',
+    'Sales PGM Status':      'category',
+    'Alloc Div Code':        'category',
+    'Division Code':         'category',
+    'Expected Qty':          'Int32',
+    'Dc Operand':            'float64',
+    'Expected Cost':         'float64',
+}
+INPUT_SCHEMAS = {
+    'SPMS_MAIN': {
+        'required': ['Promotion No'],
+        'optional': SPMS_FIELDS,
+        'project':  False,   # exported whole in the per-BEBS 'SPMS' sheet
+        'dtypes':   SPMS_DTYPES,
+    },
+    'SPMS_SECONDARY': {
+        'required': ['Promotion No'],
+        'optional': SPMS2_FIELDS,
+        'dtypes':   {col: SPMS_DTYPES[col] for col in SPMS2_FIELDS if col in SPMS_DTYPES},
+    },
+    'PSI_FILE': {
+        'required': ['Channel', 'Model.Suffix', 'Measure'],
+        'leading':  6,   # PSI metadata block, see resolve_psi_weeks()
+        'weeks':    True,
+        'dtypes':   {'Channel': 'category', 'Model.Suffix': 'category',
+                     'Measure': 'category', 'weeks': 'float64'},
+    },
+}
+
+# Claim enrichment engine: 'columnar' (join-based) or 'reference' (row-wise apply)
+CLAIM_ENGINE = os.getenv('CLAIM_ENGINE', 'columnar')
+
+# Dedup-first enrichment: compute once per distinct key tuple, broadcast to rows
+DEDUP_ENRICHMENT = os.getenv('DEDUP_ENRICHMENT', '1') == '1'
+
+# PSI measures summed over each promotion window: (PSI 'Measure' value, claim column).
+# All measures are filled in one pass; append here to add a column.
+PSI_MEASURES = [
+    ('Sell-Out FCST_KAM [R+F]', 'SELL-OUT'),
+    ('Sell-In FCST_KAM [R+F]',  'SELL-IN'),
+    ('Ch. Inventory_Sellable',  'INVENTORY'),
+]
+
+# Worker processes for PSI enrichment (1 = in-process, no pool)
+PSI_WORKERS = int(os.getenv('PSI_WORKERS', '1'))
+
+# Tracker ingestion: canonical column → accepted header spellings (case-insensitive)
+TRACKER_COLUMN_ALIASES = {
+    'Customer':     ['Customer', 'Customer Name', 'Bill To Name', 'Account'],
+    'Model':        ['Model', 'Model.Suffix', 'Model Code', 'Product Code'],
+    'Claim Volume': ['Claim Volume', 'Claim Qty', 'Claimed Qty', 'Volume'],
+}
+
+# Worker processes for reading closed-orders year files (1 = sequential)
+CLOSED_ORDERS_WORKERS = int(os.getenv('CLOSED_ORDERS_WORKERS', '1'))
+
+# Snapshot cache of parsed Excel sheets: opt-in, set a directory to enable
+# (e.g. os.path.join(CACHE_DIR, 'snapshots'))
+SNAPSHOT_CACHE_DIR = os.getenv('SNAPSHOT_CACHE_DIR') or None
+# Size bound; least recently used snapshots are evicted beyond it
+SNAPSHOT_CACHE_MAX_MB = int(os.getenv('SNAPSHOT_CACHE_MAX_MB', '2048'))
+
+# Per-user secret used to sign cache files, so tampered ones are never unpickled
+CACHE_KEY_FILE = os.getenv(
+    'CACHE_KEY_FILE', os.path.join(os.path.expanduser('~'), '.claim_verificator_cache.key')
+)
+
+# Raw closed-order lines per stored chunk (bounds memory while storing / loading)
+CLOSED_ORDERS_LINE_CHUNK = int(os.getenv('CLOSED_ORDERS_LINE_CHUNK', '50000'))
+
+# Persistent per-file closed-orders aggregates (empty string disables the store)
+CLOSED_ORDERS_STORE_DIR = os.getenv(
+    'CLOSED_ORDERS_STORE_DIR', os.path.join(CACHE_DIR, 'closed_orders')
+) or None
+
 # Excel sheet names
 SHEET_CLAIM          = 'CLAIM'
 SHEET_SPMS_MAIN      = 'Report 1'
 SHEET_SPMS_SECONDARY = 'Report 7'
+SPMS_MAIN_SKIPROWS      = 3  # title rows above the 'Report 1' header
+SPMS_SECONDARY_SKIPROWS = 2  # title rows above the 'Report 7' header
 SHEET_PSI            = None  # default to first sheet
 SHEET_OLDTRACKER     = None  # default to first sheet
 
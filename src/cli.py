@@ -1,6 +1,7 @@
 import argparse
 import sys
 import config.config as cfg
+from src.io.file_ops import default_snapshot_cache
 from src.main import main
 
 def parse_args():
@@ -38,10 +39,51 @@ def parse_args():
         help="Directory where timestamped output folders will be created",
         default=cfg.OUTPUT_DIR,
     )
+    parser.add_argument(
+        "--cache-info",
+        action="store_true",
+        help="List the Excel snapshot cache entries and exit",
+    )
+    parser.add_argument(
+        "--cache-clear",
+        nargs="*",
+        metavar="FILE",
+        default=None,
+        help="Delete cached snapshots (of the given files only, if any) and exit",
+    )
     return parser.parse_args()
 
+def run_cache_command(args) -> bool:
+    """Handle --cache-info / --cache-clear. Returns True if one was given."""
+    if not args.cache_info and args.cache_clear is None:
+        return False
+
+    cache = default_snapshot_cache()
+    if cache is None:
+        print("Snapshot cache is disabled (set SNAPSHOT_CACHE_DIR to enable it).")
+        return True
+
+    if args.cache_clear is not None:
+        if args.cache_clear:
+            removed = sum(cache.invalidate(path) for path in args.cache_clear)
+        else:
+            removed = cache.clear()
+        print(f"Removed {removed} snapshot(s) from {cache.root}")
+
+    if args.cache_info:
+        entries = cache.entries()
+        total = sum(e['bytes'] for e in entries)
+        print(f"{cache.root}: {len(entries)} snapshot(s), "
+              f"{total / 2**20:.1f} MiB of {cache.max_bytes / 2**20:.0f} MiB")
+        for e in entries:
+            print(f"  {e['last_used']:%Y-%m-%d %H:%M}  {e['bytes'] / 2**20:8.1f} MiB  "
+                  f"{e['source'] or '(source changed)'}")
+    return True
+
 def run_cli():
     args = parse_args()
+    if run_cache_command(args):
+        return
 
     # Override the config module values
     cfg.CLAIM_FILE          = args.claim
@@ -7,8 +7,13 @@ and listing closed order sources. Supports .xlsx, .xls, and .xlsb.
 
 import os
 import glob
+import hmac
+import json
+import pickle
+import hashlib
+import secrets
+import logging
 import pandas as pd
-import openpyxl
 from datetime import datetime
 
 # Attempt to import pyxlsb for .xlsb support
@@ -18,6 +23,8 @@ except ImportError:
     pyxlsb = None
 
 import config.config as cfg
+from src.utils.date_utils import week_label_to_ordinal
+from src.utils.string_utils import normalize_header
 
 
 def create_unique_folder(base_name: str, path: str = None) -> str:
@@ -41,45 +48,553 @@ def create_unique_folder(base_name: str, path: str = None) -> str:
     return full_path
 
 
+class MissingColumnsError(ValueError):
+    """Raised when a sheet lacks columns the caller asked for."""
+
+
+def _is_week_column(schema: dict, position: int, name) -> bool:
+    return (bool(schema.get('weeks')) and position >= schema.get('leading', 0)
+            and week_label_to_ordinal(name) is not None)
+
+
+def schema_columns(columns, schema: dict, label: str) -> list[int]:
+    """
+    Positions of `columns` to load under an INPUT_SCHEMAS entry. Headers are
+    compared after normalize_header(). Absent optional columns are logged;
+    absent required columns raise MissingColumnsError. Schemas with
+    'project': False keep every column.
+    """
+    names = [normalize_header(c) for c in columns]
+    required = schema.get('required', [])
+    optional = schema.get('optional', [])
+
+    missing = [c for c in required if c not in names]
+    if missing:
+        raise MissingColumnsError(f"{label}: missing required columns {missing}")
+    absent = [c for c in optional if c not in names]
+    if absent:
+        logging.warning(f"{label}: optional columns not found {absent}")
+
+    if not schema.get('project', True):
+        return list(range(len(names)))
+
+    wanted = set(required) | set(optional)
+    keep = [
+        pos for pos, (raw, name) in enumerate(zip(columns, names))
+        if pos < schema.get('leading', 0) or name in wanted or _is_week_column(schema, pos, raw)
+    ]
+    logging.info(f"{label}: loading {len(keep)} of {len(names)} columns")
+    return keep
+
+
+def apply_schema_dtypes(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """
+    Cast columns to the schema's target dtypes ('category' or numeric).
+    A column that does not fit an integer dtype (fractions, overflow) is
+    loaded as float64 instead, with a warning.
+    """
+    dtypes = schema.get('dtypes', {})
+    if not dtypes:
+        return df
+    targets = {}
+    for pos, col in enumerate(df.columns):
+        key = 'weeks' if _is_week_column(schema, pos, col) else normalize_header(col)
+        if key in dtypes:
+            targets[col] = dtypes[key]
+
+    df = df.copy()
+    for col, dtype in targets.items():
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+            continue
+        values = pd.to_numeric(df[col], errors='coerce')
+        try:
+            df[col] = values.astype(dtype)
+        except (TypeError, ValueError, OverflowError):
+            logging.warning(f"Column {col!r} does not fit {dtype}; loaded as float64")
+            df[col] = values.astype('float64')
+    return df
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of the file content, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _signing_key() -> bytes:
+    """
+    Per-user secret for signing cache files, created on first use at
+    cfg.CACHE_KEY_FILE (mode 0600, outside the cache directories).
+    """
+    key_file = cfg.CACHE_KEY_FILE
+    if not os.path.exists(key_file):
+        # Written aside and hard-linked in, so a concurrent reader never sees
+        # a partial key and the first process to link wins
+        tmp_path = f"{key_file}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(secrets.token_bytes(32))
+        try:
+            os.link(tmp_path, key_file)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(key_file, 'rb') as fh:
+        return fh.read()
+
+
+def dump_signed(obj, path: str) -> None:
+    """Pickle `obj` to `path` (atomically) behind an HMAC-SHA256 signature."""
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    mac = hmac.new(_signing_key(), payload, hashlib.sha256).digest()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as fh:
+        fh.write(mac)
+        fh.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load_signed(path: str):
+    """
+    Load a file written by dump_signed(). The signature is checked before
+    anything is unpickled, so a tampered or foreign file raises ValueError.
+    """
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    mac, payload = data[:32], data[32:]
+    expected = hmac.new(_signing_key(), payload, hashlib.sha256).digest()
+    if not hmac.compare_digest(mac, expected):
+        raise ValueError("signature mismatch")
+    return pickle.loads(payload)
+
+
+def write_signed_record(fh, obj) -> None:
+    """
+    Append `obj` to an open binary file as one signed record (length,
+    HMAC-SHA256, pickle), so large tables can be written chunk by chunk.
+    """
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    fh.write(len(payload).to_bytes(8, 'little'))
+    fh.write(hmac.new(_signing_key(), payload, hashlib.sha256).digest())
+    fh.write(payload)
+
+
+def iter_signed_records(path: str):
+    """
+    Yield the objects of a file written with write_signed_record(), one at a
+    time. Each record's signature is checked before it is unpickled; a
+    tampered or truncated file raises ValueError.
+    """
+    key = _signing_key()
+    with open(path, 'rb') as fh:
+        while True:
+            size = fh.read(8)
+            if not size:
+                return
+            mac = fh.read(32)
+            payload = fh.read(int.from_bytes(size, 'little'))
+            if len(size) < 8 or len(mac) < 32 or len(payload) != int.from_bytes(size, 'little'):
+                raise ValueError("truncated record")
+            if not hmac.compare_digest(mac, hmac.new(key, payload, hashlib.sha256).digest()):
+                raise ValueError("signature mismatch")
+            yield pickle.loads(payload)
+
+
+def _remove_quietly(path: str) -> bool:
+    """os.remove() that tolerates another process having removed it first."""
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class SnapshotCache:
+    """
+    Parsed sheets stored on local disk, so an unchanged workbook is parsed
+    only once across runs.
+
+    A snapshot is keyed by the source path, its content hash and the read
+    arguments (sheet, header/skiprows, schema, ...), so editing the file
+    changes the key and its old snapshots simply stop being used. Each
+    path's hash is remembered with its size and mtime in its own
+    fingerprint file (no shared index to race on) and only recomputed when
+    either changes. Snapshots are signed pickles (dump_signed), never
+    loaded unless the signature matches. Every hit touches the snapshot;
+    once the directory exceeds `max_bytes` the least recently used ones
+    are deleted.
+    """
+
+    SUFFIX = '.snap'
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def _path_id(path: str) -> str:
+        return hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+
+    def _fingerprint_path(self, path_id: str) -> str:
+        return os.path.join(self.root, f"{path_id}.json")
+
+    def _read_fingerprint(self, path_id: str):
+        try:
+            with open(self._fingerprint_path(path_id), encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def fingerprint(self, path: str) -> str:
+        """Content hash of `path`, recomputed only when size or mtime changed."""
+        path = os.path.abspath(path)
+        path_id = self._path_id(path)
+        stat = os.stat(path)
+        known = self._read_fingerprint(path_id)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['digest']
+        digest = file_digest(path)
+        target = self._fingerprint_path(path_id)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump({'path': path, 'size': stat.st_size,
+                       'mtime_ns': stat.st_mtime_ns, 'digest': digest}, fh)
+        os.replace(tmp_path, target)
+        return digest
+
+    def key(self, path: str, **read_args) -> str:
+        """Snapshot key: path id + content hash prefix + hash of the read arguments."""
+        spec = json.dumps(read_args, sort_keys=True, default=str)
+        return (f"{self._path_id(path)}_{self.fingerprint(path)[:20]}_"
+                f"{hashlib.sha1(spec.encode('utf-8')).hexdigest()[:20]}")
+
+    def _snapshot_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}{self.SUFFIX}")
+
+    def get(self, key: str):
+        """Cached frame for `key`, or None (unreadable or unsigned snapshots are dropped)."""
+        snapshot = self._snapshot_path(key)
+        if not os.path.exists(snapshot):
+            return None
+        try:
+            frame = load_signed(snapshot)
+        except Exception as e:
+            logging.warning(f"Discarding unreadable snapshot {snapshot}: {e}")
+            _remove_quietly(snapshot)
+            return None
+        try:
+            os.utime(snapshot)
+        except FileNotFoundError:
+            pass
+        return frame
+
+    def put(self, key: str, frame: pd.DataFrame) -> None:
+        """Store `frame` under `key`, then evict down to max_bytes."""
+        snapshot = self._snapshot_path(key)
+        dump_signed(frame, snapshot)
+        self.evict(keep=snapshot)
+
+    def entries(self) -> list[dict]:
+        """Snapshots, most recently used first, with size and source path."""
+        out = []
+        for name in os.listdir(self.root):
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            known = self._read_fingerprint(name.split('_', 1)[0])
+            out.append({
+                'key':       name[:-len(self.SUFFIX)],
+                'source':    known['path'] if known else None,
+                'bytes':     stat.st_size,
+                'last_used': datetime.fromtimestamp(stat.st_mtime),
+            })
+        return sorted(out, key=lambda e: e['last_used'], reverse=True)
+
+    def evict(self, keep: str = None) -> int:
+        """Delete least recently used snapshots until within max_bytes."""
+        entries = self.entries()
+        total = sum(e['bytes'] for e in entries)
+        removed = 0
+        for entry in reversed(entries):
+            if total <= self.max_bytes:
+                break
+            snapshot = self._snapshot_path(entry['key'])
+            if snapshot == keep:
+                continue
+            removed += _remove_quietly(snapshot)
+            total -= entry['bytes']
+        if removed:
+            logging.info(f"Snapshot cache: evicted {removed} least recently used snapshot(s)")
+        return removed
+
+    def invalidate(self, path: str) -> int:
+        """Drop every snapshot read from `path`, and its fingerprint."""
+        path_id = self._path_id(path)
+        removed = sum(
+            _remove_quietly(self._snapshot_path(entry['key']))
+            for entry in self.entries() if entry['key'].startswith(f"{path_id}_")
+        )
+        _remove_quietly(self._fingerprint_path(path_id))
+        return removed
+
+    def clear(self) -> int:
+        """Delete every snapshot and fingerprint."""
+        removed = 0
+        for name in os.listdir(self.root):
+            if name.endswith(self.SUFFIX):
+                removed += _remove_quietly(os.path.join(self.root, name))
+            elif name.endswith('.json'):
+                _remove_quietly(os.path.join(self.root, name))
+        return removed
+
+
+def default_snapshot_cache():
+    """SnapshotCache from config, or None unless cfg.SNAPSHOT_CACHE_DIR is set (opt-in)."""
+    if not cfg.SNAPSHOT_CACHE_DIR:
+        return None
+    return SnapshotCache(cfg.SNAPSHOT_CACHE_DIR, cfg.SNAPSHOT_CACHE_MAX_MB * 2**20)
+
+
+class ExcelSource:
+    """
+    One Excel workbook (xls, xlsx, or xlsb) opened once and read sheet by
+    sheet from the same handle.
+    - Unwraps a one-element list into a str.
+    - Uses pyxlsb for .xlsb and openpyxl (read-only) for .xlsx.
+    - Closes the workbook on close() or when leaving a `with` block.
+    - read() goes through the snapshot cache (`cache=True`: the configured
+      default_snapshot_cache(); None/False: off); the workbook itself is
+      only opened when something actually has to be parsed.
+    """
+
+    def __init__(self, path, cache=True):
+        if isinstance(path, (list, tuple)):
+            path = path[0]
+        self.path = path
+        self.ext = os.path.splitext(path)[1].lower()
+        self.cache = default_snapshot_cache() if cache is True else (cache or None)
+
+        self._engine = None
+        if self.ext == '.xlsb':
+            if pyxlsb is None:
+                raise ImportError("pyxlsb is required to read .xlsb files; install via `pip install pyxlsb`")
+            self._engine = 'pyxlsb'
+        self._book = None
+
+    def _workbook(self) -> pd.ExcelFile:
+        """The open workbook, opened on first use."""
+        if self._book is None:
+            self._book = pd.ExcelFile(self.path, engine=self._engine)
+        return self._book
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the underlying workbook handle (idempotent)."""
+        if self._book is not None:
+            self._book.close()
+            self._book = None
+
+    @property
+    def sheet_names(self) -> list[str]:
+        return list(self._workbook().sheet_names)
+
+    def resolve(self, sheet_name=None, fallback: bool = True) -> str:
+        """
+        Sheet to read: `sheet_name` if present (or a position if an int),
+        else the first sheet. With fallback=False a missing name raises.
+        """
+        sheets = self.sheet_names
+        if isinstance(sheet_name, int):
+            return sheets[sheet_name]
+        if sheet_name and sheet_name in sheets:
+            return sheet_name
+        if sheet_name and not fallback:
+            raise ValueError(f"Worksheet {sheet_name!r} not found in {os.path.basename(self.path)}")
+        return sheets[0]
+
+    def read(
+        self,
+        sheet_name=None,
+        fallback: bool = True,
+        schema: dict = None,
+        **kwargs
+    ) -> pd.DataFrame:
+        """
+        Parse one sheet; kwargs (header, skiprows, ...) go to pandas.
+        With an INPUT_SCHEMAS entry, the header row is read first and only
+        the schema's columns are parsed (usecols), then cast to its dtypes.
+        Results are served from / saved to the snapshot cache when enabled.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(self.path, sheet_name=sheet_name, fallback=fallback,
+                                 schema=schema, kwargs=kwargs)
+            frame = self.cache.get(key)
+            if frame is not None:
+                logging.info(f"Loaded {os.path.basename(self.path)} [{sheet_name}] from snapshot cache")
+                return frame
+
+        target = self.resolve(sheet_name, fallback)
+        book = self._workbook()
+        if schema is None:
+            frame = book.parse(target, **kwargs)
+        else:
+            header = book.parse(target, nrows=0, **kwargs).columns
+            label = f"{os.path.basename(self.path)} [{target}]"
+            usecols = schema_columns(header, schema, label)
+            frame = apply_schema_dtypes(book.parse(target, usecols=usecols, **kwargs), schema)
+
+        if key is not None:
+            self.cache.put(key, frame)
+        return frame
+
+    def read_sheets(self, specs: dict) -> dict:
+        """
+        Parse several sheets from the open workbook, each with its own
+        arguments: {sheet_name: {'skiprows': 3, ...}} → {sheet_name: DataFrame}.
+        Missing sheets raise instead of falling back to the first sheet.
+        """
+        return {
+            sheet: self.read(sheet, fallback=False, **(kwargs or {}))
+            for sheet, kwargs in specs.items()
+        }
+
+    def iter_rows(self, sheet_name=None):
+        """
+        Yield the rows of one sheet as sequences of cell values, one at a
+        time, from the open handle (pyxlsb rows / openpyxl read-only rows).
+        .xls has no streaming reader and is parsed whole first.
+        """
+        target = self.resolve(sheet_name)
+        book = self._workbook().book
+        if self.ext == '.xlsb':
+            with book.get_sheet(target) as sheet:
+                for row in sheet.rows():
+                    yield [cell.v for cell in row]
+        elif self.ext == '.xls':
+            df = self.read(target, header=None)
+            yield from df.itertuples(index=False, name=None)
+        else:
+            yield from book[target].iter_rows(values_only=True)
+
+
 def read_excel_file(path, sheet_name=None, **kwargs) -> pd.DataFrame:
     """
     Read a single-sheet Excel file (xls, xlsx, or xlsb) into a DataFrame.
-    - Unwraps a one-element list into a str.
-    - Uses pyxlsb for .xlsb (listing sheets via wb.sheets, engine='pyxlsb').
-    - Uses openpyxl for .xlsx/.xls (wb.sheetnames).
     - If sheet_name is provided and exists, uses it; otherwise defaults to the first.
-    - Passes additional kwargs (e.g. skiprows) to pd.read_excel.
+    - Passes additional kwargs (e.g. skiprows) to pandas.
+    Use ExcelSource directly to read several sheets of the same workbook.
     """
-    # 1) Unwrap single-element lists/tuples
-    if isinstance(path, (list, tuple)):
-        path = path[0]
+    with ExcelSource(path) as source:
+        return source.read(sheet_name, **kwargs)
 
-    ext = os.path.splitext(path)[1].lower()
 
-    # 2) Determine available sheet-names
-    if ext == '.xlsb':
-        if pyxlsb is None:
-            raise ImportError("pyxlsb is required to read .xlsb files; install via `pip install pyxlsb`")
-        wb = pyxlsb.open_workbook(path)
-        sheets = wb.sheets  # list of strings
-    else:
-        # openpyxl for xlsx/xls
-        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
-        sheets = wb.sheetnames
+def read_spms_reports(path) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Load both SPMS report sheets from one open workbook:
+    cfg.SHEET_SPMS_MAIN (skipping cfg.SPMS_MAIN_SKIPROWS rows) and
+    cfg.SHEET_SPMS_SECONDARY (skipping cfg.SPMS_SECONDARY_SKIPROWS rows).
+    Each is projected to its INPUT_SCHEMAS entry.
+    Returns (spms_df, spms2_df), ready for create_lookup_store().
+    """
+    with ExcelSource(path) as source:
+        spms_df = source.read(cfg.SHEET_SPMS_MAIN, skiprows=cfg.SPMS_MAIN_SKIPROWS,
+                              schema=cfg.INPUT_SCHEMAS.get('SPMS_MAIN'))
+        spms2_df = source.read(cfg.SHEET_SPMS_SECONDARY, skiprows=cfg.SPMS_SECONDARY_SKIPROWS,
+                               schema=cfg.INPUT_SCHEMAS.get('SPMS_SECONDARY'))
+    return spms_df, spms2_df
 
-    # 3) Choose the sheet to read
-    if sheet_name and sheet_name in sheets:
-        target = sheet_name
-    else:
-        target = sheets[0]
 
-    # 4) Build kwargs for pandas.read_excel
-    read_args = {'sheet_name': target, **kwargs}
-    if ext == '.xlsb':
-        read_args['engine'] = 'pyxlsb'
+def _iter_sheet_rows(path: str, sheet_name=None):
+    """Rows of one sheet, streamed through an ExcelSource closed on exit."""
+    with ExcelSource(path) as source:
+        yield from source.iter_rows(sheet_name)
+
+
+def iter_excel_columns(
+    path: str,
+    columns: list[str],
+    optional_columns: list[str] = (),
+    sheet_name=None,
+    header: int = 0,
+    keep_all: bool = False
+):
+    """
+    Stream one sheet and yield, per non-blank row, the tuple of the values
+    in `columns` followed by those `optional_columns` present in the header.
+    - `header` is the 0-based row holding the column names.
+    - keep_all=True appends every other named column, in sheet order, so
+      the tuples are whole rows (the requested columns still come first).
+    - The first yielded item is the list of column names actually extracted.
+    Raises MissingColumnsError if any of `columns` is absent from the header.
+    """
+    rows = _iter_sheet_rows(path, sheet_name)
+    try:
+        for _ in range(header):
+            next(rows, None)
+        names = list(next(rows, None) or [])
+        missing = [c for c in columns if c not in names]
+        if missing:
+            raise MissingColumnsError(
+                f"Missing columns in {os.path.basename(path)}: {missing}"
+            )
+        extracted = list(columns) + [c for c in optional_columns if c in names]
+        positions = [names.index(c) for c in extracted]
+        if keep_all:
+            rest = [pos for pos, name in enumerate(names)
+                    if name is not None and pos not in positions]
+            extracted += [names[pos] for pos in rest]
+            positions += rest
+        yield extracted
 
-    # 5) Read and return
-    return pd.read_excel(path, **read_args)
+        for row in rows:
+            width = len(row)
+            values = tuple(row[i] if i < width else None for i in positions)
+            if any(v is not None for v in values):
+                yield values
+    finally:
+        rows.close()
+
+
+def read_excel_filtered(
+    path: str,
+    columns: list[str],
+    row_filter=None,
+    sheet_name=None,
+    header: int = 0,
+    optional_columns: list[str] = (),
+    keep_all: bool = False
+) -> pd.DataFrame:
+    """
+    Stream one sheet and build a DataFrame of only the rows that survive.
+    - Only `columns` (plus any present `optional_columns`) are extracted,
+      unless keep_all=True keeps whole rows (see iter_excel_columns).
+    - `row_filter(values)` receives the tuple of those values and returns
+      True to keep the row; None keeps every non-blank row.
+    Peak memory is bounded by the surviving rows, not by the file size.
+    Raises MissingColumnsError if any of `columns` is absent from the header.
+    """
+    rows = iter_excel_columns(path, columns, optional_columns, sheet_name, header, keep_all)
+    extracted = next(rows)
+    if row_filter is None:
+        kept = list(rows)
+    else:
+        kept = [values for values in rows if row_filter(values)]
+    return pd.DataFrame(kept, columns=extracted)
 
 
 def write_excel_file(df: pd.DataFrame, path: str, sheet_name: str = 'Sheet1', index: bool = False):
@@ -0,0 +1,137 @@
+# src/io/order_store.py
+
+"""
+On-disk store of per-file closed-orders aggregates.
+
+Each closed-orders workbook is parsed once; its full aggregates are pickled
+(signed, see file_ops.dump_signed) under the store directory and reused
+while the file is unchanged. A file counts as unchanged when its size and
+mtime match the stored entry, or, failing that, when its content hash still
+matches (e.g. after a copy that touched the mtime).
+
+The raw order lines of a file are kept apart from its aggregates, as a
+sequence of signed chunks, so reading the small aggregates never loads
+them and neither writing nor reading them holds the whole table at once.
+"""
+
+import os
+import hashlib
+import logging
+from contextlib import contextmanager
+
+from src.io.file_ops import (
+    dump_signed,
+    file_digest,
+    iter_signed_records,
+    load_signed,
+    write_signed_record,
+)
+
+# Bump when the layout of the stored aggregates changes
+STORE_VERSION = 5
+
+
+class OrderAggregateStore:
+    """
+    Persistent aggregates of closed-orders files, one signed pickle per
+    source file, plus an optional chunked file of its raw order lines.
+
+    Entries hold a dict of DataFrames, e.g. 'totals' (Bill To Name Short,
+    Model, Order Qty) and 'daily' (… plus Order Date). The content hash is
+    only computed when size or mtime differ from the stored entry, or when
+    a new entry is written.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, mode=0o700, exist_ok=True)
+
+    def _key(self, filepath: str) -> str:
+        return hashlib.sha1(os.path.abspath(filepath).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, filepath: str) -> str:
+        return os.path.join(self.root, f"{self._key(filepath)}.pkl")
+
+    def _lines_path(self, filepath: str) -> str:
+        return os.path.join(self.root, f"{self._key(filepath)}.lines")
+
+    def _read_entry(self, filepath: str):
+        entry_path = self._entry_path(filepath)
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            entry = load_signed(entry_path)
+        except Exception as e:
+            logging.warning(f"Discarding unreadable store entry {entry_path}: {e}")
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            return None
+        if entry.get('version') != STORE_VERSION:
+            return None
+        if entry['has_lines'] and not os.path.exists(self._lines_path(filepath)):
+            return None
+        return entry
+
+    def _write_entry(self, filepath: str, entry: dict) -> None:
+        dump_signed(entry, self._entry_path(filepath))
+
+    def get(self, filepath: str):
+        """
+        Stored aggregates for `filepath`, or None if missing or stale.
+        An entry whose content hash still matches after an mtime change is
+        refreshed so the next lookup is a plain stat comparison again.
+        """
+        entry = self._read_entry(filepath)
+        if entry is None:
+            return None
+
+        stat = os.stat(filepath)
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['aggregates']
+        if entry['size'] != stat.st_size or file_digest(filepath) != entry['digest']:
+            return None
+
+        entry['mtime_ns'] = stat.st_mtime_ns
+        self._write_entry(filepath, entry)
+        return entry['aggregates']
+
+    @contextmanager
+    def lines_writer(self, filepath: str):
+        """
+        Context yielding a `write(chunk)` callable that appends DataFrame
+        chunks of raw order lines for `filepath`. The file replaces the
+        previous one only when the block completes; call put() afterwards.
+        """
+        lines_path = self._lines_path(filepath)
+        tmp_path = f"{lines_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as fh:
+                yield lambda chunk: write_signed_record(fh, chunk)
+            os.replace(tmp_path, lines_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def iter_lines(self, filepath: str):
+        """Stored raw order line chunks of `filepath` (none if never written)."""
+        lines_path = self._lines_path(filepath)
+        if os.path.exists(lines_path):
+            yield from iter_signed_records(lines_path)
+
+    def put(self, filepath: str, aggregates: dict, has_lines: bool = False) -> None:
+        """
+        Store `aggregates` for the current content of `filepath`; with
+        `has_lines`, the entry is only valid while its lines file exists.
+        """
+        stat = os.stat(filepath)
+        self._write_entry(filepath, {
+            'version':    STORE_VERSION,
+            'path':       os.path.abspath(filepath),
+            'size':       stat.st_size,
+            'mtime_ns':   stat.st_mtime_ns,
+            'digest':     file_digest(filepath),
+            'has_lines':  has_lines,
+            'aggregates': aggregates,
+        })
@@ -21,21 +21,28 @@ from src.io.file_ops import (
     read_data,
     write_excel_file,
     create_unique_folder,
-    read_excel_file,
+    read_spms_reports,
+    ExcelSource,
+)
+from src.utils.lookup import create_lookup_store
+from src.utils.date_utils import render_weeks_range
+from src.processing.claim import (
+    enrich_claim_data,
+    enrich_claim_data_columnar,
+    resolve_promotion_chains,
 )
-from src.utils.lookup import create_lookup_dict
-from src.processing.claim import enrich_claim_data
 from src.processing.orders import merge_closed_orders
 from src.processing.psi import enrich_psi_data
-from src.processing.tracker import enrich_tracker_data
+from src.processing.tracker import enrich_tracker_data, ingest_trackers, PreparedTracker
 from src.processing.output_splits import split_by_bebs
 from src.output.formatter import format_workbook
 
-def auto_read(path, sheet=None, header=None):
+def auto_read(path, sheet=None, header=None, schema=None):
     """
     Load a single-sheet Excel/CSV/JSON file:
      - if sheet is None, read the *first* sheet (sheet_name=0)
      - if header is None, use header row = 0
+     - Excel sheets are projected/cast by `schema` (an INPUT_SCHEMAS entry)
     """
     ext = os.path.splitext(path)[1].lower()
     # determine pandas args
@@ -43,7 +50,8 @@ def auto_read(path, sheet=None, header=None):
     header_arg = header if header is not None else 0
 
     if ext in ('.xls', '.xlsx', '.xlsb'):
-        return pd.read_excel(path, sheet_name=sheet_arg, header=header_arg)
+        with ExcelSource(path) as source:
+            return source.read(sheet_arg, fallback=False, schema=schema, header=header_arg)
     elif ext == '.csv':
         return pd.read_csv(path, header=header_arg)
     elif ext == '.json':
@@ -118,21 +126,23 @@ def main(progress_callback=None):
             substep += 1
             continue
 
+        # only the columns declared for this input (None = whole sheet)
+        schema = cfg.INPUT_SCHEMAS.get(key)
+
         # d) load: multi‐file → read_data, else Excel/CSV/JSON with sheet headers
         if isinstance(path, (list, tuple)):
             df = read_data(path)
         else:
             if sheets:
-                frames = []
-                for sheet_name, hdr in sheets.items():
-                    frames.append(pd.read_excel(
-                        path,
-                        sheet_name=sheet_name,
-                        header=hdr-1
-                    ))
-                df = pd.concat(frames, ignore_index=True)
+                # one open workbook, each sheet with its own header row
+                with ExcelSource(path) as source:
+                    frames = source.read_sheets({
+                        sheet_name: {'header': hdr - 1, 'schema': schema}
+                        for sheet_name, hdr in sheets.items()
+                    })
+                df = pd.concat(frames.values(), ignore_index=True)
             else:
-                df = auto_read(path, sheet=None, header=None)
+                df = auto_read(path, sheet=None, header=None, schema=schema)
 
         # e) store + progress
         inputs[key] = df
@@ -146,19 +156,8 @@ def main(progress_callback=None):
     claim_df = inputs['CLAIM_FILE']
     psi_df   = inputs['PSI_FILE']
     
-    # ─── SPECIAL-CASE SPMS: load both sheets via read_excel_file ───────────
-    spms_df = read_excel_file(
-        cfg.SPMS_FILE,
-        sheet_name=cfg.SHEET_SPMS_MAIN,
-        skiprows=3
-    )
-    spms2_df = read_excel_file(
-        cfg.SPMS_FILE,
-        sheet_name=cfg.SHEET_SPMS_SECONDARY,
-        skiprows=2
-    )
-    
-
+    # ─── SPECIAL-CASE SPMS: both report sheets from one open workbook ──────
+    spms_df, spms2_df = read_spms_reports(cfg.SPMS_FILE)
 
     # ─── Audit loaded column names ───────────────────────
     logging.info(f"CLAIM_FILE columns: {claim_df.columns.tolist()}")
@@ -201,18 +200,21 @@ def main(progress_callback=None):
     closed_list = inputs['CLOSED_ORDERS_DIR']  # list of paths
 
     # ─── Collect tracker DataFrames ─────────────────────
-    tracker_parts = []
+    tracker_parts = {}
     for tk_key in ('TRACKER_HA','TRACKER_ID','TRACKER_CURRYS','TRACKER_JLP',
                    'TRACKER_P3_TV','TRACKER_P5_EU','TRACKER_P5_APAC',
                    'TRACKER_P6_TV','NEW_TRACKER_1'):
         if tk_key in inputs:
-            tracker_parts.append(inputs[tk_key])
-
-    # Concatenate into one DataFrame (so enrich_tracker_data() can index columns)
-    if tracker_parts:
-        tracker_df = pd.concat(tracker_parts, ignore_index=True)
-    else:
-        tracker_df = pd.DataFrame()
+            # moved out of `inputs`: the raw frames are only kept by `tracker`
+            tracker_parts[tk_key] = inputs.pop(tk_key)
+
+    # Project each tracker onto Customer / Model / Claim Volume (+ Source)
+    # before concatenating, so the combined frame stays narrow and compact
+    tracker_df = ingest_trackers(tracker_parts)
+    # Normalise once: keys, volumes and the (Customer Short, Model) index are
+    # shared by the tracker enrichment and the per-BEBS split; the raw frames
+    # back the full-row Part 6 export (no wide concat is ever built)
+    tracker = PreparedTracker(tracker_df, sources=tracker_parts)
     # Log and save intermediate
     elapsed = time.time() - start_time
     log_records.append({
@@ -227,25 +229,26 @@ def main(progress_callback=None):
         progress_callback("Load Inputs", 1, elapsed)
 
        # ─── Step 2: Enrich Claim Data (sub-steps) ────────────
-    # 2.1 Build SPMS lookup
-    if progress_callback:
-        elapsed = time.time() - start_time
-        progress_callback(f"2.{substep} Build SPMS lookup",
-                          substep,
-                          elapsed,
-                          df=spms_df)
-    spms_map = create_lookup_dict(spms_df, 'Promotion No', cfg.SPMS_FIELDS)
-    substep += 1
+    # 2.1 / 2.2 Build the SPMS lookups (only the reference engine reads them;
+    #           the columnar engine joins the SPMS frames directly)
+    if cfg.CLAIM_ENGINE == 'reference':
+        if progress_callback:
+            elapsed = time.time() - start_time
+            progress_callback(f"2.{substep} Build SPMS lookup",
+                              substep,
+                              elapsed,
+                              df=spms_df)
+        spms_map = create_lookup_store(spms_df, 'Promotion No', cfg.SPMS_FIELDS)
+        substep += 1
 
-    # 2.2 Build secondary SPMS lookup
-    if progress_callback:
-        elapsed = time.time() - start_time
-        progress_callback(f"2.{substep} Build SPMS2 lookup",
-                          substep,
-                          elapsed,
-                          df=spms_df)
-    spms2_map = create_lookup_dict(spms2_df, 'Promotion No', cfg.SPMS2_FIELDS)
-    substep += 1
+        if progress_callback:
+            elapsed = time.time() - start_time
+            progress_callback(f"2.{substep} Build SPMS2 lookup",
+                              substep,
+                              elapsed,
+                              df=spms_df)
+        spms2_map = create_lookup_store(spms2_df, 'Promotion No', cfg.SPMS2_FIELDS)
+        substep += 1
 
     # 2.3 Apply enrich_claim_data
     if progress_callback:
@@ -254,7 +257,14 @@ def main(progress_callback=None):
                           substep,
                           elapsed,
                           df=claim_df)
-    enriched_claim = enrich_claim_data(claim_df, spms_map, spms2_map)
+    if cfg.CLAIM_ENGINE == 'reference':
+        enriched_claim = enrich_claim_data(claim_df, spms_map, spms2_map,
+                                           dedup=cfg.DEDUP_ENRICHMENT)
+    else:
+        enriched_claim = enrich_claim_data_columnar(claim_df, spms_df, spms2_df,
+                                                    dedup=cfg.DEDUP_ENRICHMENT)
+    # Root promotion and live successor from the cancel/recreate graph
+    enriched_claim = resolve_promotion_chains(enriched_claim, spms_df)
     substep += 1
 
     # record & save
@@ -279,7 +289,12 @@ def main(progress_callback=None):
     substep += 1
 
     # ─── Step 3: Merge Closed Orders ──────────────────────
-    enriched_orders = merge_closed_orders(enriched_claim, closed_list)
+    enriched_orders, closed_detail = merge_closed_orders(
+        enriched_claim, closed_list,
+        workers=cfg.CLOSED_ORDERS_WORKERS,
+        store_dir=cfg.CLOSED_ORDERS_STORE_DIR,
+        return_detail=True
+    )
     new_cols = sorted(set(enriched_orders.columns) - set(enriched_claim.columns))
     elapsed = time.time() - start_time
     log_records.append({
@@ -294,7 +309,8 @@ def main(progress_callback=None):
         progress_callback("Merge Closed Orders", 3, elapsed)
 
     # ─── Step 4: Enrich PSI Data ──────────────────────────
-    enriched_psi = enrich_psi_data(enriched_orders, psi_df)
+    enriched_psi = enrich_psi_data(enriched_orders, psi_df, dedup=cfg.DEDUP_ENRICHMENT,
+                                   workers=cfg.PSI_WORKERS)
     new_cols = sorted(set(enriched_psi.columns) - set(enriched_orders.columns))
     elapsed = time.time() - start_time
     log_records.append({
@@ -310,7 +326,7 @@ def main(progress_callback=None):
 
     # ─── Step 5: Enrich Tracker Data ─────────────────────
     # with
-    final_df = enrich_tracker_data(enriched_psi, tracker_df)
+    final_df = enrich_tracker_data(enriched_psi, tracker, dedup=cfg.DEDUP_ENRICHMENT)
     new_cols = sorted(set(final_df.columns) - set(enriched_psi.columns))
     elapsed = time.time() - start_time
     log_records.append({
@@ -327,7 +343,7 @@ def main(progress_callback=None):
 
 # ─── Prep Part 5 DF ───────────────────────────────────
     # Grab the single “Part 5” tracker (may be empty)
-    part5_df = inputs.get('TRACKER_P5_EU', pd.DataFrame())
+    part5_df = tracker_parts.get('TRACKER_P5_EU', pd.DataFrame())
 
 
 
@@ -335,7 +351,7 @@ def main(progress_callback=None):
     master_path = os.path.join(folder_path, "6_master_verified.xlsx")
     log_df = pd.DataFrame(log_records)
     with pd.ExcelWriter(master_path, engine="openpyxl") as writer:
-        final_df.to_excel(writer, sheet_name="Verified", index=False)
+        render_weeks_range(final_df).to_excel(writer, sheet_name="Verified", index=False)
         log_df.to_excel(writer, sheet_name="Log",      index=False)
     format_workbook(master_path)
 
@@ -357,14 +373,15 @@ def main(progress_callback=None):
         format_workbook(master_path)
         # ─── Step 7: Split per-BEBS (Parts 6+5) ───────────────
     # Build Part 5 DataFrame (single file)
-    part5_df = inputs.get('TRACKER_P5_EU', pd.DataFrame())# or whichever key you used for Part 5
+    part5_df = tracker_parts.get('TRACKER_P5_EU', pd.DataFrame())# or whichever key you used for Part 5
 
     split_by_bebs(
         cleaned_df=final_df,
-        tracker_part6_df=tracker_df,
+        tracker_part6_df=tracker,
         tracker_part5_df=part5_df,
         spms_df=spms_df,
-        output_folder=folder_path
+        output_folder=folder_path,
+        closed_orders=closed_detail
     )
 
     elapsed = time.time() - start_time
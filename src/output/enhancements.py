@@ -0,0 +1,57 @@
+# src/output/enhancements.py
+
+"""
+Extra sheets appended to the per-BEBS workbooks after the main split.
+"""
+
+import logging
+import pandas as pd
+
+from src.utils.date_utils import excel_dates
+
+
+def add_closed_orders_by_year(
+    workbook_path: str,
+    subset: pd.DataFrame,
+    closed_orders=None,
+    date_col: str = 'Order Date',
+    sheet_prefix: str = 'Closed Orders'
+):
+    """
+    Append one "<sheet_prefix> <year>" sheet per closed-orders year holding
+    the raw order lines (all source columns) for the subset's
+    (Bill To Name Short, Product Code SPMS) pairs, in file order.
+
+    Parameters
+    ----------
+    workbook_path : str
+        Existing .xlsx workbook to append to.
+    subset : pd.DataFrame
+        The BEBS rows (VERIFICATION sheet).
+    closed_orders : ClosedOrdersDetail, optional
+        The run's in-memory detail from merge_closed_orders(); the workbooks
+        are never re-read. Without it no sheets are added.
+    date_col : str
+        Order date column; written as plain dates when present.
+    sheet_prefix : str
+        Sheet name prefix, followed by the year.
+    """
+    if closed_orders is None or not len(closed_orders):
+        logging.info(f"No closed-orders detail available for {workbook_path}; skipping year sheets.")
+        return
+
+    pairs = (
+        subset[['Bill To Name Short', 'Product Code SPMS']]
+        .drop_duplicates()
+        .itertuples(index=False, name=None)
+    )
+    by_year = closed_orders.select(pairs)
+    if not by_year:
+        return
+
+    with pd.ExcelWriter(workbook_path, engine='openpyxl', mode='a') as writer:
+        for year, rows in by_year.items():
+            if date_col in rows.columns:
+                rows[date_col] = excel_dates(rows[date_col]).dt.date.to_numpy()
+            rows.to_excel(writer, index=False, sheet_name=f"{sheet_prefix} {year}"[:31])
+    logging.info(f"Added closed-orders sheets for years {list(by_year)} to {workbook_path}")
@@ -1,35 +1,74 @@
 # src/processing/claim.py
 
 import logging
+import numpy as np
 import pandas as pd
 
-from src.utils.date_utils import date_to_week, date_to_year, generate_weeks_range_monday
-from src.utils.string_utils import extract_short_name
-
-from src.utils.lookup import (
-    lookup_value,
-    lookup_customer,
-    lookup_customer2,
-    lookup_SPGM
+from src.utils.date_utils import (
+    date_to_week,
+    date_to_year,
+    parse_yyyymmdd,
+    dates_to_weeks,
+    dates_to_years,
+    week_ordinals,
 )
+from src.utils.string_utils import extract_short_name, prefix_match
+import config.config as cfg
+
+from src.utils.lookup import SpmsIndex
+from src.processing.dedup import enrich_by_unique_keys
+
+# Columns enrich_claim_data() derives from (promotion, customer, product)
+CLAIM_OUTPUT_COLS = [
+    'Cancel Flag',
+    'Recreate Flag',
+    'Promotion Start Date',
+    'Promotion End Date',
+    'Promotion Start Week',
+    'Promotion End Week',
+    'Promotion Start Year',
+    'Promotion End Year',
+    'Bill To Name SPMS',
+    'Product Code SPMS',
+    'Sales PGM NO',
+    'Bill To Name Short',
+    'Week Start Ordinal',
+    'Week End Ordinal',
+]
 
 def enrich_claim_data(
     claim_df: pd.DataFrame,
-    spms_map: dict,
-    spms2_map: dict,
+    spms_map,
+    spms2_map: dict = None,
     promo_key: str = 'Promotion No',
     customer_field: str = 'Bill To Name',
-    product_field: str = 'Product Code'
+    product_field: str = 'Product Code',
+    dedup: bool = False
 ) -> pd.DataFrame:
     """
     Enrich the raw claim DataFrame with SPMS lookups, flags, date/week/year fields,
-    and a 'Week's range' column for downstream processing.
+    and the promotion window as 'Week Start Ordinal' / 'Week End Ordinal'
+    for downstream processing (see date_utils.render_weeks_range).
+
+    `spms_map` is either a create_lookup_dict() dict (indexed here together with
+    `spms2_map`) or a prebuilt SpmsIndex. With `dedup`, each distinct
+    (promotion, customer, product) tuple is enriched once and broadcast.
     """
+    index = spms_map if isinstance(spms_map, SpmsIndex) else SpmsIndex(spms_map, spms2_map)
+    if dedup:
+        return enrich_by_unique_keys(
+            claim_df,
+            [promo_key, customer_field, product_field],
+            lambda d: enrich_claim_data(d, index, None, promo_key, customer_field, product_field),
+            CLAIM_OUTPUT_COLS,
+            label='Claim enrichment'
+        )
+
     df = claim_df.copy()
     logging.info("Starting claim enrichment…")
 
     # Mark which promotions exist in SPMS
-    df['_has_spms'] = df[promo_key].isin(spms_map)
+    df['_has_spms'] = df[promo_key].isin(index.primary)
 
     # Define row‐level enrichment function
     def _enrich(row):
@@ -51,13 +90,16 @@ def enrich_claim_data(
             row['Product Code SPMS'] = ''
             row['Sales PGM NO'] = ''
         else:
+            # One indexed probe returns every SPMS field for this line
+            hit = index.lookup_all(promo, cust, prod)
+
             # Cancel / Recreate flags (Y → 1, else 0)
-            row['Cancel Flag'] = 1 if lookup_value(promo, 'Cancel Flag', spms_map) == 'Y' else 0
-            row['Recreate Flag'] = 1 if lookup_value(promo, 'Recreate Flag', spms_map) == 'Y' else 0
+            row['Cancel Flag'] = 1 if hit['Cancel Flag'] == 'Y' else 0
+            row['Recreate Flag'] = 1 if hit['Recreate Flag'] == 'Y' else 0
 
             # Promotion start / end dates
-            start_date = lookup_value(promo, 'Promotion Start YYYYMMDD', spms_map)
-            end_date   = lookup_value(promo, 'Promotion End YYYYMMDD', spms_map)
+            start_date = hit['Promotion Start YYYYMMDD']
+            end_date   = hit['Promotion End YYYYMMDD']
             row['Promotion Start Date'] = start_date
             row['Promotion End Date']   = end_date
 
@@ -72,28 +114,10 @@ def enrich_claim_data(
                 row['Promotion Start Week'] = row['Promotion End Week'] = 0
                 row['Promotion Start Year'] = row['Promotion End Year'] = 0
 
-            # Look up SPMS customer and product fields
-            row['Bill To Name SPMS'] = lookup_customer(
-                promo,
-                'Bill To Name',
-                spms_map,
-                customer_name=cust[:12],
-                secondary_lookup_dict=spms2_map
-            )
-            row['Product Code SPMS'] = lookup_customer2(
-                promo,
-                'Product Code',
-                spms_map,
-                product_code=prod,
-                secondary_lookup_dict=spms2_map
-            )
-            # Sales PGM NO
-            row['Sales PGM NO'] = lookup_SPGM(
-                promo,
-                cust,
-                spms_map,
-                secondary_lookup_dict=spms2_map
-            )
+            # SPMS customer, product and Sales PGM NO (Report 7 fallback inside the index)
+            row['Bill To Name SPMS'] = hit['Bill To Name SPMS']
+            row['Product Code SPMS'] = hit['Product Code SPMS']
+            row['Sales PGM NO'] = hit['Sales PGM NO']
 
         return row
 
@@ -106,16 +130,342 @@ def enrich_claim_data(
     # Derive a 12‐char uppercase short name for closed‐orders matching
     df['Bill To Name Short'] = df['Bill To Name SPMS'].fillna('').apply(lambda x: extract_short_name(x, 12))
 
-    # Build the week's range string for each promotion
-    df["Week's range"] = df.apply(
-        lambda r: ', '.join(
-            generate_weeks_range_monday(
-                r.get('Promotion Start Date', 0),
-                r.get('Promotion End Date', 0)
-            )
-        ),
-        axis=1
-    )
+    # Promotion window as integer week ordinals (start / end Monday);
+    # the "Week's range" labels are rendered only at export time
+    df['Week Start Ordinal'] = week_ordinals(df['Promotion Start Date'])
+    df['Week End Ordinal'] = week_ordinals(df['Promotion End Date'])
 
     logging.info("Finished claim enrichment.")
     return df
+
+
+def _spms_table(spms_df, promo_index: pd.Index, promo_key: str, fields: list) -> pd.DataFrame:
+    """
+    Project an SPMS report onto `fields`, tagging each line with its promotion
+    code (position in `promo_index`) and its original row order.
+    """
+    if spms_df is None or promo_key not in getattr(spms_df, 'columns', []):
+        return pd.DataFrame(columns=['_code', '_pos'] + fields)
+    table = spms_df.reindex(columns=fields).reset_index(drop=True)
+    table['_code'] = promo_index.get_indexer(spms_df[promo_key])
+    table['_pos'] = np.arange(len(table))
+    return table[table['_code'] >= 0]
+
+
+def _first_match(keys: pd.DataFrame, table: pd.DataFrame, match_col: str,
+                 field: str, exact: bool) -> pd.Series:
+    """
+    For every row of `keys` (columns _key, _code, _val) return `field` from the
+    first `table` line of the same promotion whose `match_col` starts with
+    (or, if `exact`, equals) _val. Keys without a matching line are absent.
+    """
+    cols = list(dict.fromkeys(['_code', '_pos', match_col, field]))
+    cand = keys.merge(table[cols], on='_code')
+    if exact:
+        ok = ((cand['_val'] == '') |
+              (cand[match_col].astype(object).fillna('').astype(str) == cand['_val'])).to_numpy()
+    else:
+        ok = prefix_match(cand[match_col], cand['_val'])
+    cand = (
+        cand[ok]
+        .sort_values(['_key', '_pos'], kind='stable')
+        .drop_duplicates('_key', keep='first')
+    )
+    return cand.set_index('_key')[field]
+
+
+def _resolve_with_fallback(values: pd.Series, codes: pd.Series, primary: pd.DataFrame,
+                           secondary: pd.DataFrame, match_col: str, field: str,
+                           exact: bool) -> pd.Series:
+    """
+    Join distinct (promotion, value) keys against Report 1, then join the keys
+    Report 1 could not resolve against Report 7. Returns one value per input row
+    (None where neither report has a matching line).
+    """
+    keys = pd.DataFrame({'_code': codes.to_numpy(), '_val': values.to_numpy()})
+    distinct = keys.drop_duplicates().reset_index(drop=True)
+    distinct['_key'] = np.arange(len(distinct))
+
+    found = _first_match(distinct, primary, match_col, field, exact)
+    missing = distinct[~distinct['_key'].isin(found.index)]
+    if not missing.empty and not secondary.empty and field in secondary.columns:
+        found = pd.concat([found, _first_match(missing, secondary, match_col, field, exact)])
+
+    resolved = distinct['_key'].map(found).astype(object)
+    resolved = resolved.where(distinct['_key'].isin(found.index), None)
+    lookup = keys.merge(distinct.assign(_res=resolved), on=['_code', '_val'], how='left')
+    return pd.Series(lookup['_res'].to_numpy(), index=values.index, dtype=object)
+
+
+def enrich_claim_data_columnar(
+    claim_df: pd.DataFrame,
+    spms_df: pd.DataFrame,
+    spms2_df: pd.DataFrame = None,
+    promo_key: str = 'Promotion No',
+    customer_field: str = 'Bill To Name',
+    product_field: str = 'Product Code',
+    dedup: bool = False
+) -> pd.DataFrame:
+    """
+    Vectorized counterpart of enrich_claim_data().
+
+    Produces the same columns by joining the claim frame against the SPMS
+    Report 1 (`spms_df`) and Report 7 (`spms2_df`) frames instead of running a
+    row-wise apply. The Report 1 → Report 7 fallback for Bill To Name SPMS,
+    Product Code SPMS and Sales PGM NO is a second join over the keys the first
+    join left unresolved. enrich_claim_data() remains the reference implementation.
+    With `dedup`, each distinct (promotion, customer, product) tuple is
+    enriched once and broadcast back to its rows.
+    """
+    if dedup:
+        return enrich_by_unique_keys(
+            claim_df,
+            [promo_key, customer_field, product_field],
+            lambda d: enrich_claim_data_columnar(
+                d, spms_df, spms2_df, promo_key, customer_field, product_field
+            ),
+            CLAIM_OUTPUT_COLS,
+            label='Claim enrichment'
+        )
+
+    df = claim_df.copy()
+    logging.info("Starting columnar claim enrichment…")
+
+    promo_index = pd.Index(
+        pd.concat([spms_df[promo_key], spms2_df[promo_key]])
+        if spms2_df is not None and promo_key in spms2_df.columns
+        else spms_df[promo_key]
+    ).dropna().unique()
+    primary = _spms_table(spms_df, promo_index, promo_key, cfg.SPMS_FIELDS)
+    secondary = _spms_table(spms2_df, promo_index, promo_key, cfg.SPMS2_FIELDS)
+
+    codes = pd.Series(promo_index.get_indexer(df[promo_key]), index=df.index)
+    first = primary.drop_duplicates('_code', keep='first').set_index('_code')
+    has_spms = codes.isin(first.index)
+
+    def _first_value(field):
+        # Map through object dtype: the NaN of promotions missing from SPMS
+        # would otherwise turn int YYYYMMDD dates into floats ('20210101.0')
+        return codes.map(first[field].astype(object)).where(has_spms, 0)
+
+    # Cancel / Recreate flags (Y → 1, else 0)
+    df['Cancel Flag'] = (_first_value('Cancel Flag') == 'Y').astype(int)
+    df['Recreate Flag'] = (_first_value('Recreate Flag') == 'Y').astype(int)
+
+    # Promotion start / end dates
+    start = _first_value('Promotion Start YYYYMMDD')
+    end = _first_value('Promotion End YYYYMMDD')
+    df['Promotion Start Date'] = start
+    df['Promotion End Date'] = end
+
+    # Weeks and years via the batch date converters (invalid dates → 0)
+    valid = has_spms & parse_yyyymmdd(start).notna() & parse_yyyymmdd(end).notna()
+    if (has_spms & ~valid).any():
+        logging.warning(
+            f"Week/year conversion failed for promos "
+            f"{sorted(df.loc[has_spms & ~valid, promo_key].astype(str).unique())}"
+        )
+    df['Promotion Start Week'] = dates_to_weeks(start).where(valid, 0)
+    df['Promotion End Week'] = dates_to_weeks(end).where(valid, 0)
+    df['Promotion Start Year'] = dates_to_years(start).where(valid, 0)
+    df['Promotion End Year'] = dates_to_years(end).where(valid, 0)
+
+    # SPMS customer / product / SPGM joins with Report 7 fallback
+    cust = (df[customer_field] if customer_field in df.columns
+            else pd.Series('', index=df.index)).fillna('').astype(str)
+    prod = (df[product_field] if product_field in df.columns
+            else pd.Series('', index=df.index)).fillna('').astype(str)
+    hit_codes = codes[has_spms]
+
+    def _joined(values, match_col, field, exact):
+        out = pd.Series('', index=df.index, dtype=object)
+        if has_spms.any():
+            out[has_spms] = _resolve_with_fallback(
+                values[has_spms], hit_codes, primary, secondary, match_col, field, exact
+            )
+        return out
+
+    df['Bill To Name SPMS'] = _joined(cust.str[:12], 'Bill To Name', 'Bill To Name', False)
+    df['Product Code SPMS'] = _joined(prod, 'Product Code', 'Product Code', True)
+    df['Sales PGM NO'] = _joined(cust, 'Bill To Name', 'Sales PGM NO', False)
+
+    # Derive a 12‐char uppercase short name for closed‐orders matching
+    df['Bill To Name Short'] = df['Bill To Name SPMS'].fillna('').apply(lambda x: extract_short_name(x, 12))
+
+    # Promotion window as integer week ordinals (start / end Monday)
+    df['Week Start Ordinal'] = week_ordinals(start)
+    df['Week End Ordinal'] = week_ordinals(end)
+
+    logging.info("Finished columnar claim enrichment.")
+    return df
+
+
+def _promo_text(values: pd.Series) -> pd.Series:
+    """
+    Normalise promotion numbers to comparable strings ('123.0' → '123');
+    blanks, zeros and NaN become NA.
+    """
+    text = values.astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    return text.mask(text.isin(['', '0', 'nan', 'NaN', 'None', '<NA>']))
+
+
+class _UnionFind:
+    """Array-backed disjoint sets with path halving and union by size."""
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+
+
+def _promo_values(text: pd.Series, dtype) -> pd.Series:
+    """
+    Normalised promotion numbers (see _promo_text) back in the promotion
+    column's dtype family: integer → nullable Int64, float → float, else
+    text with '' for missing.
+    """
+    if pd.api.types.is_integer_dtype(dtype):
+        return pd.to_numeric(text, errors='coerce').astype('Int64')
+    if pd.api.types.is_float_dtype(dtype):
+        return pd.to_numeric(text, errors='coerce')
+    return text.astype(object).fillna('')
+
+
+def build_promotion_chains(
+    spms_df: pd.DataFrame,
+    promo_key: str = 'Promotion No',
+    original_col: str = 'Original Promotion No',
+    cancel_col: str = 'Cancel Flag',
+    recreate_col: str = 'Recreate Flag',
+    start_col: str = 'Promotion Start YYYYMMDD'
+) -> pd.DataFrame:
+    """
+    Resolve cancel/recreate chains in SPMS once, in near-linear time.
+
+    A promotion flagged as a recreation (Recreate Flag 'Y') is unioned with
+    the promotion its 'Original Promotion No' points at; without a Recreate
+    Flag column every original link counts. Chain members are ordered by
+    their SPMS start date ('Promotion Start YYYYMMDD'), then promotion
+    number. Per chain, the root is the
+    first member without an original and the live successor is the last
+    member that is neither cancelled nor itself recreated into another
+    promotion.
+
+    Returns
+    -------
+    pd.DataFrame
+        Indexed by normalised promotion number (text), with columns
+        'Root Promotion No' and 'Live Promotion No' in the dtype family of
+        SPMS 'Promotion No' (missing when a chain has no live member).
+    """
+    empty = pd.DataFrame(columns=['Root Promotion No', 'Live Promotion No'])
+    if spms_df is None or promo_key not in spms_df.columns:
+        return empty
+
+    heads = spms_df.drop_duplicates(promo_key, keep='first')
+    promos = _promo_text(heads[promo_key])
+    keep = promos.notna().to_numpy()
+    heads, promos = heads[keep], promos[keep]
+    if heads.empty:
+        return empty
+    originals = (_promo_text(heads[original_col]) if original_col in heads.columns
+                 else pd.Series(pd.NA, index=heads.index, dtype=object))
+    originals = originals.mask(originals == promos)
+    if recreate_col in heads.columns:
+        originals = originals.where(heads[recreate_col] == 'Y')
+    cancelled = (heads[cancel_col] == 'Y').to_numpy() if cancel_col in heads.columns \
+        else np.zeros(len(heads), dtype=bool)
+
+    # Nodes: every promotion, plus originals that have no SPMS line of their own
+    nodes = pd.Index(pd.concat([promos, originals.dropna()]).unique())
+    n = len(nodes)
+    child = nodes.get_indexer(promos)
+    parent = nodes.get_indexer(originals.fillna(''))
+
+    is_cancelled = np.zeros(n, dtype=bool)
+    is_cancelled[child] = cancelled
+    has_original = np.zeros(n, dtype=bool)
+    has_successor = np.zeros(n, dtype=bool)
+    linked = parent >= 0
+    has_original[child[linked]] = True
+    has_successor[parent[linked]] = True
+
+    sets = _UnionFind(n)
+    for c, p in zip(child[linked], parent[linked]):
+        sets.union(int(c), int(p))
+    component = np.fromiter((sets.find(i) for i in range(n)), dtype=np.intp, count=n)
+
+    # Chain order: start date, then promotion number (numerically when it is one)
+    start = pd.Series(pd.NaT, index=range(n), dtype='datetime64[ns]')
+    if start_col in heads.columns:
+        start.iloc[child] = parse_yyyymmdd(_promo_text(heads[start_col])).to_numpy()
+    text = pd.Series(nodes, dtype=object)
+    rank = np.empty(n, dtype=np.intp)
+    rank[pd.DataFrame({'start': start, 'number': pd.to_numeric(text, errors='coerce'),
+                       'text': text})
+             .sort_values(['start', 'number', 'text'], na_position='first', kind='stable')
+             .index.to_numpy()] = np.arange(n)
+
+    members = pd.DataFrame({
+        'component': component,
+        'node': np.arange(n),
+        'rank': rank,
+        'is_root': ~has_original,
+        'is_live': ~is_cancelled & ~has_successor & np.isin(np.arange(n), child),
+    }).sort_values('rank')
+    # Root: first member without an original (first member overall for cycles)
+    roots = (members.sort_values(['is_root', 'rank'], ascending=[False, True], kind='stable')
+                    .drop_duplicates('component')
+                    .set_index('component')['node'])
+    # Live successor: last uncancelled member that was not recreated further
+    live = members[members['is_live']].groupby('component')['node'].last()
+
+    root_nodes = roots.reindex(component).to_numpy()
+    live_nodes = live.reindex(component).to_numpy()
+    has_live = pd.notna(live_nodes)
+    live_text = pd.Series(pd.NA, index=range(n), dtype=object)
+    live_text[has_live] = text.to_numpy()[live_nodes[has_live].astype(np.intp)]
+    dtype = heads[promo_key].dtype
+    chains = pd.DataFrame({
+        'Root Promotion No': _promo_values(pd.Series(text.to_numpy()[root_nodes]), dtype),
+        'Live Promotion No': _promo_values(live_text, dtype),
+    }).set_axis(nodes)
+    n_chains = int((members.groupby('component').size() > 1).sum())
+    logging.info(f"Promotion chains: {n} promotions, {n_chains} cancel/recreate chains")
+    return chains
+
+
+def resolve_promotion_chains(
+    claim_df: pd.DataFrame,
+    spms_df: pd.DataFrame,
+    promo_key: str = 'Promotion No'
+) -> pd.DataFrame:
+    """
+    Add 'Root Promotion No' and 'Live Promotion No' to every claim row from
+    the SPMS cancel/recreate graph (see build_promotion_chains), in the
+    claim's own promotion dtype family. Promotions not in SPMS (or chains
+    without a live member) are left missing: <NA> / NaN for numeric
+    promotion numbers, '' for text ones.
+    """
+    df = claim_df.copy()
+    chains = build_promotion_chains(spms_df, promo_key)
+    keys = _promo_text(df[promo_key])
+    for col in ('Root Promotion No', 'Live Promotion No'):
+        mapped = keys.map(_promo_text(chains[col].astype(object)))
+        df[col] = _promo_values(mapped, df[promo_key].dtype)
+    return df
@@ -0,0 +1,58 @@
+# src/processing/dedup.py
+
+"""
+Dedup-first execution: run an enrichment once per distinct key tuple and
+broadcast its output columns back to every row sharing that key.
+"""
+
+import logging
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+
+def enrich_by_unique_keys(
+    df: pd.DataFrame,
+    key_cols: List[str],
+    enrich: Callable[[pd.DataFrame], pd.DataFrame],
+    output_cols: List[str],
+    label: str = 'enrichment'
+) -> pd.DataFrame:
+    """
+    Apply `enrich` to one representative row per distinct `key_cols` tuple and
+    copy its `output_cols` onto all rows with the same key.
+
+    `enrich` must derive `output_cols` from the key columns only; any other
+    column it writes is discarded. Key columns missing from df are ignored.
+
+    Returns
+    -------
+    pd.DataFrame
+        Copy of df with `output_cols` set (added at the end, or overwritten
+        in place when they already exist).
+    """
+    keys = [c for c in key_cols if c in df.columns]
+    out = df.copy()
+    if df.empty or not keys:
+        return enrich(out)
+
+    codes = df.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    first = ~pd.Series(codes).duplicated().to_numpy()
+    reps = df.loc[first]
+
+    n_rows, n_keys = len(df), len(reps)
+    logging.info(
+        f"{label}: {n_rows} rows → {n_keys} distinct keys on {keys} "
+        f"(reduction ×{n_rows / max(n_keys, 1):.1f})"
+    )
+
+    enriched = enrich(reps)
+    slot = np.empty(codes.max() + 1, dtype=np.intp)
+    slot[codes[first]] = np.arange(n_keys)
+    positions = slot[codes]
+
+    for col in output_cols:
+        if col in enriched.columns:
+            out[col] = enriched[col].iloc[positions].set_axis(out.index)
+    return out
@@ -3,15 +3,322 @@
 import os
 import re
 import logging
+import numpy as np
 import pandas as pd
 
-from src.io.file_ops import read_excel_file
-from src.utils.string_utils import extract_short_name
+from src.io.file_ops import MissingColumnsError, iter_excel_columns, read_excel_filtered
+from src.io.order_store import OrderAggregateStore
+from src.utils.date_utils import excel_dates, parse_yyyymmdd
+from src.utils.string_utils import code_key, extract_short_name
+import config.config as cfg
+
+
+def _closed_orders_year(filepath: str) -> str:
+    """Leading 4-digit year of the file name, or 'unknown'."""
+    match = re.match(r'(\d{4})', os.path.basename(filepath))
+    return match.group(1) if match else 'unknown'
+
+
+def _to_qty(value) -> float:
+    """Numeric Order Qty cell value; blanks and text count as 0."""
+    try:
+        qty = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if qty != qty else qty
+
+
+def _collapse_daily(rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sum Order Qty per (short, model, day). Raw Order Date cells may be
+    datetimes with a time part, Excel serials (.xlsb) or text, so they are
+    parsed with excel_dates() and normalised.
+    """
+    rows = rows[['Bill To Name Short', 'Model', 'Order Date', 'Order Qty']].copy()
+    rows['Order Date'] = excel_dates(rows['Order Date']).dt.normalize().to_numpy()
+    return (
+        rows.groupby(['Bill To Name Short', 'Model', 'Order Date'], as_index=False, dropna=False)
+        ['Order Qty'].sum()
+    )
+
+
+def _order_lines(lines: pd.DataFrame, shorts: dict) -> pd.DataFrame:
+    """Raw order lines with their 'Bill To Name Short' and parsed Order Date."""
+    lines.insert(0, 'Bill To Name Short', [shorts[name] for name in lines['Bill To Name']])
+    if 'Order Date' in lines:
+        lines['Order Date'] = excel_dates(lines['Order Date']).to_numpy()
+    return lines
+
+
+def aggregate_full_closed_orders_file(filepath: str, lines_sink=None) -> dict:
+    """
+    Stream a whole closed-orders workbook into its store aggregates, with no
+    claim filter so the result can be reused by any later claim.
+
+    Parameters
+    ----------
+    filepath : str
+        The closed-orders workbook.
+    lines_sink : callable, optional
+        Receives every raw order line (all columns plus its short name) as
+        DataFrame chunks of cfg.CLOSED_ORDERS_LINE_CHUNK rows, so the whole
+        line table is never held in memory.
+
+    Returns
+    -------
+    dict
+        'totals': (Bill To Name Short, Model, Order Qty) over the file,
+                  with Model as code_key() text;
+        'daily':  (Bill To Name Short, Model, Order Date, Order Qty), or
+                  None when the file has no 'Order Date' column.
+    """
+    rows = iter_excel_columns(
+        filepath, ['Bill To Name', 'Model', 'Order Qty'],
+        optional_columns=['Order Date'], keep_all=lines_sink is not None
+    )
+    columns = next(rows)
+    has_date = 'Order Date' in columns
+
+    def flush(chunk):
+        lines_sink(_order_lines(pd.DataFrame(chunk, columns=columns), shorts))
+
+    shorts, totals, daily, chunk = {}, {}, {}, []
+    for values in rows:
+        name, model, qty = values[0], code_key(values[1]), _to_qty(values[2])
+        short = shorts.get(name)
+        if short is None:
+            short = shorts[name] = extract_short_name(name, 12)
+        totals[short, model] = totals.get((short, model), 0.0) + qty
+        if has_date:
+            key = (short, model, values[3])
+            daily[key] = daily.get(key, 0.0) + qty
+        if lines_sink is not None:
+            chunk.append(values)
+            if len(chunk) >= cfg.CLOSED_ORDERS_LINE_CHUNK:
+                flush(chunk)
+                chunk = []
+    if chunk:
+        flush(chunk)
+
+    keys = ['Bill To Name Short', 'Model']
+    totals_df = pd.DataFrame(
+        [(*key, qty) for key, qty in totals.items()], columns=keys + ['Order Qty']
+    )
+    daily_df = None
+    if has_date:
+        daily_df = _collapse_daily(pd.DataFrame(
+            [(*key, qty) for key, qty in daily.items()],
+            columns=keys + ['Order Date', 'Order Qty']
+        ))
+    return {'totals': totals_df, 'daily': daily_df}
+
+
+def _stored_closed_orders(filepath: str, store: OrderAggregateStore, logs: list) -> dict:
+    """
+    Aggregates of `filepath` from the store, parsing and storing on a miss
+    (the raw lines are written chunk by chunk to the store's lines file).
+    """
+    aggregates = store.get(filepath)
+    if aggregates is not None:
+        logs.append((logging.INFO,
+                     f"Using stored aggregates for {os.path.basename(filepath)}"))
+        return aggregates
+    with store.lines_writer(filepath) as write:
+        aggregates = aggregate_full_closed_orders_file(filepath, lines_sink=write)
+    store.put(filepath, aggregates, has_lines=True)
+    return aggregates
+
+
+def aggregate_closed_orders_file(args) -> tuple:
+    """
+    Stream one closed-orders workbook, keep only the rows whose 12-char
+    Bill To Name and Model appear in the claim, and sum Order Qty per
+    (short, model), and per (short, model, day) when the file has an
+    'Order Date' column. Non-matching rows are dropped while reading.
+
+    Runs in-process or as a process-pool worker, so it never raises and never
+    logs directly: messages are returned as (level, text) pairs for the
+    caller to replay in file order.
+
+    Parameters
+    ----------
+    args : tuple
+        (filepath, customers, models[, store_dir[, detail]]) with the
+        claim's short names / models. With a store_dir, the file's full
+        aggregates come from (or are saved to) the OrderAggregateStore there
+        and are filtered to the claim afterwards. With detail, the matching
+        raw order lines (all columns) are returned as well.
+
+    Returns
+    -------
+    tuple
+        (year, {'totals': DataFrame, 'daily': DataFrame or None,
+                'lines': DataFrame or None} or None,
+         [(level, message), ...])
+    """
+    filepath, customers, models, *rest = args
+    store_dir = rest[0] if rest else None
+    detail = rest[1] if len(rest) > 1 else False
+    filename = os.path.basename(filepath)
+    year = _closed_orders_year(filepath)
+    logs = [(logging.INFO, f"Reading closed-orders file {filename}")]
+
+    # Memoised short names: a customer appears on many order lines
+    shorts = {}
+
+    def keep(values):
+        name, model = values[0], values[1]
+        short = shorts.get(name)
+        if short is None:
+            short = shorts[name] = extract_short_name(name, 12)
+        return short in customers and code_key(model) in models
+
+    def in_claim(frame):
+        return frame[
+            frame['Bill To Name Short'].isin(customers)
+            & frame['Model'].map(code_key).isin(models)
+        ].reset_index(drop=True)
+
+    try:
+        if store_dir:
+            store = OrderAggregateStore(store_dir)
+            stored = _stored_closed_orders(filepath, store, logs)
+            totals = in_claim(stored['totals'])
+            daily = None if stored['daily'] is None else in_claim(stored['daily'])
+            # Raw lines are only loaded for the detail, one chunk at a time
+            lines = None
+            if detail:
+                chunks = [in_claim(chunk) for chunk in store.iter_lines(filepath)]
+                lines = pd.concat(chunks, ignore_index=True) if chunks else None
+        else:
+            # Stream the first sheet, building only the matching rows
+            # (whole rows when the raw detail is wanted)
+            filtered = read_excel_filtered(
+                filepath, ['Bill To Name', 'Model', 'Order Qty'],
+                row_filter=keep, optional_columns=['Order Date'], keep_all=detail
+            )
+            filtered = _order_lines(filtered, shorts)
+            lines = filtered.copy() if detail else None
+            filtered['Model'] = filtered['Model'].map(code_key)
+            filtered['Order Qty'] = pd.to_numeric(filtered['Order Qty'], errors='coerce')
+
+            # Aggregate quantities
+            totals = (
+                filtered
+                .groupby(['Bill To Name Short', 'Model'])['Order Qty']
+                .sum()
+                .reset_index()
+            )
+            daily = _collapse_daily(filtered) if 'Order Date' in filtered else None
+
+        if totals.empty:
+            logs.append((logging.WARNING, f"No matching records in {filename}."))
+            return year, None, logs
+        return year, {'totals': totals, 'daily': daily, 'lines': lines}, logs
+
+    except MissingColumnsError as e:
+        logs.append((logging.WARNING, f"{e}. Skipping."))
+        return year, None, logs
+
+    except Exception as e:
+        logs.append((logging.ERROR, f"Error processing {filename}: {e}"))
+        return year, None, logs
+
+
+class OrderDateIndex:
+    """
+    Closed-order quantities by (short, model) and day, for window sums.
+
+    Rows are sorted by (pair, day) into one composite int64 key with a
+    running quantity total, so the quantity ordered inside any [start, end]
+    day window is two binary searches and a subtraction per claim row.
+    """
+
+    def __init__(self, daily: pd.DataFrame):
+        daily = daily.dropna(subset=['Order Date'])
+        keys = pd.MultiIndex.from_arrays([daily['Bill To Name Short'], daily['Model']])
+        codes, self.pairs = keys.factorize()
+        days = daily['Order Date'].to_numpy('datetime64[D]').astype(np.int64)
+
+        self.min_day = int(days.min()) if len(days) else 0
+        max_day = int(days.max()) if len(days) else 0
+        # Day offsets are 1..span-1; offsets 0 and span never hold a key
+        self.span = max_day - self.min_day + 2
+
+        composite = codes.astype(np.int64) * self.span + (days - self.min_day + 1)
+        order = np.argsort(composite, kind='stable')
+        self.keys = composite[order]
+        qty = daily['Order Qty'].fillna(0).to_numpy(dtype=np.float64)[order]
+        self.cumulative = np.concatenate([[0.0], np.cumsum(qty)])
+
+    def window_totals(self, shorts, models, start, end) -> np.ndarray:
+        """
+        Quantity ordered between `start` and `end` (inclusive datetimes) for
+        each (short, model); 0 for unknown pairs or missing dates.
+        """
+        pair = self.pairs.get_indexer(pd.MultiIndex.from_arrays([shorts, models]))
+        start = pd.Series(pd.to_datetime(start)).reset_index(drop=True)
+        end = pd.Series(pd.to_datetime(end)).reset_index(drop=True)
+        valid = (pair >= 0) & start.notna().to_numpy() & end.notna().to_numpy()
+
+        def offsets(dates):
+            days = dates.fillna(pd.Timestamp(0)).to_numpy('datetime64[D]').astype(np.int64)
+            return np.clip(days - self.min_day + 1, 0, self.span)
+
+        base = np.where(valid, pair, 0).astype(np.int64) * self.span
+        lo = np.searchsorted(self.keys, base + offsets(start), side='left')
+        hi = np.searchsorted(self.keys, base + offsets(end), side='right')
+        out = self.cumulative[np.maximum(hi, lo)] - self.cumulative[lo]
+        return np.where(valid, out, 0.0)
+
+
+class ClosedOrdersDetail:
+    """
+    Claim-relevant raw closed-order lines (every source column plus
+    'Bill To Name Short' and 'Year'), built once in merge_closed_orders()
+    and shared by the per-BEBS split.
+
+    A hash index (short, model, year) → row positions answers each BEBS by
+    lookup instead of re-reading the workbooks; rows keep file order.
+    """
+
+    KEYS = ['Bill To Name Short', 'Model', 'Year']
+
+    def __init__(self, detail: pd.DataFrame, columns_by_year: dict = None):
+        self.frame = detail.reset_index(drop=True)
+        # each year's own source columns (files may differ between years)
+        self.columns_by_year = columns_by_year or {}
+        self.rows_by_key = self.frame.groupby(
+            [self.frame['Bill To Name Short'], self.frame['Model'].map(code_key),
+             self.frame['Year']], sort=False
+        ).indices
+        self.years = sorted(self.frame['Year'].unique())
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def select(self, pairs) -> dict:
+        """{year: raw order lines} for an iterable of (short, model) pairs."""
+        pairs = [(short, code_key(model)) for short, model in pairs]
+        out = {}
+        for year in self.years:
+            hits = [self.rows_by_key[(short, model, year)] for short, model in pairs
+                    if (short, model, year) in self.rows_by_key]
+            if hits:
+                rows = np.sort(np.concatenate(hits))
+                columns = self.columns_by_year.get(
+                    year, [c for c in self.frame.columns if c != 'Year'])
+                out[year] = self.frame.iloc[rows][columns].reset_index(drop=True)
+        return out
+
 
 def merge_closed_orders(
     claim_df: pd.DataFrame,
-    closed_files: list[str]
-) -> pd.DataFrame:
+    closed_files: list[str],
+    workers: int = 1,
+    store_dir: str = None,
+    return_detail: bool = False
+):
     """
     Merge closed-orders into the claim dataframe.
 
@@ -21,88 +328,108 @@ def merge_closed_orders(
         The enriched claim DataFrame (must include 'Bill To Name Short' and 'Product Code SPMS').
     closed_files : list[str]
         List of file paths to the closed-orders Excel workbooks.
+    workers : int
+        With more than one worker, the year files are read and aggregated in
+        a process pool; each worker returns only its small aggregate.
+    store_dir : str, optional
+        Directory of the persistent per-file aggregate store. Unchanged files
+        are then answered from the store instead of being re-parsed.
+    return_detail : bool
+        Also return the ClosedOrdersDetail: the raw order lines of the
+        claim's customer/model pairs, collected in the same read.
 
     Returns
     -------
-    pd.DataFrame
+    pd.DataFrame, or (pd.DataFrame, ClosedOrdersDetail) with return_detail
         A copy of claim_df with:
-        - One 'Order Qty <year>' column per file (summing Order Qty)
+        - One 'Order Qty <year>' column per year (files sharing a year are summed)
         - A 'Total Closed Orders' column summing across years.
+        - A 'Promo Window Orders' column with the quantity whose Order Date
+          falls within Promotion Start/End Date, when the files carry dates.
     """
     df = claim_df.copy()
     logging.info("Starting merge_closed_orders…")
 
     # Prepare lookup sets
     customers = set(df['Bill To Name Short'].dropna().unique())
-    models    = set(df['Product Code SPMS'].dropna().unique())
-
-    for filepath in closed_files:
-        filename = os.path.basename(filepath)
-        # Extract leading 4-digit year, fallback to 'unknown'
-        match = re.match(r'(\d{4})', filename)
-        year = match.group(1) if match else 'unknown'
-
-        try:
-            logging.info(f"Reading closed-orders file {filename}")
-            sheets = read_excel_file(filepath, sheet_name=None)
-
-            # Get the first sheet as a DataFrame
-            if isinstance(sheets, dict):
-                sheet_df = list(sheets.values())[0].copy()
-            else:
-                sheet_df = sheets.copy()
-
-            # Verify required columns
-            required = {'Bill To Name', 'Model', 'Order Qty'}
-            if not required.issubset(sheet_df.columns):
-                logging.warning(f"Missing columns in {filename}, expected {required}. Skipping.")
-                continue
-
-            # Build short name for filtering
-            sheet_df['Bill To Name Short'] = sheet_df['Bill To Name'] \
-                .apply(lambda x: extract_short_name(x, 12))
-
-            # Filter on matching customers & models
-            filtered = sheet_df[
-                sheet_df['Bill To Name Short'].isin(customers) &
-                sheet_df['Model'].isin(models)
-            ]
-
-            if filtered.empty:
-                logging.warning(f"No matching records in {filename}.")
-                continue
-
-            # Aggregate quantities
-            agg = (
-                filtered
-                .groupby(['Bill To Name Short', 'Model'])['Order Qty']
-                .sum()
-                .reset_index()
-            )
-            agg['Year'] = year
-
-            # Merge back into df
-            df = df.merge(
-                agg,
-                how='left',
-                left_on=['Bill To Name Short', 'Product Code SPMS'],
-                right_on=['Bill To Name Short', 'Model']
-            )
+    # Models compare as code_key() text: files and claim may read the same
+    # code as int in one and str in the other
+    models    = set(df['Product Code SPMS'].dropna().map(code_key))
+    tasks = [(filepath, customers, models, store_dir, return_detail)
+             for filepath in closed_files]
 
-            col_name = f"Order Qty {year}"
-            df[col_name] = df['Order Qty'].fillna(0).astype(int)
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        logging.info(f"Reading {len(tasks)} closed-orders files with {workers} workers")
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(aggregate_closed_orders_file, tasks))
+    else:
+        results = map(aggregate_closed_orders_file, tasks)
 
-            # Clean up
-            df.drop(columns=['Order Qty', 'Model', 'Year'], inplace=True)
+    # Stack the per-year aggregates into one long (customer, model, year, qty) table
+    frames, dailies, details, years = [], [], [], []
+    columns_by_year = {}
+    for year, agg, logs in results:
+        for level, message in logs:
+            logging.log(level, message)
+        if agg is not None:
+            frames.append(agg['totals'].assign(Year=year))
+            if agg['daily'] is not None:
+                dailies.append(agg['daily'].assign(Year=year))
+            if agg['lines'] is not None:
+                details.append(agg['lines'].assign(Year=year))
+                seen = columns_by_year.setdefault(year, [])
+                seen.extend(c for c in agg['lines'].columns if c not in seen)
+            years.append(year)
 
-            logging.info(f"Merged closed-orders for year {year}.")
+    if frames:
+        long = pd.concat(frames, ignore_index=True)
+        repeated = sorted({y for y in years if years.count(y) > 1})
+        if repeated:
+            logging.warning(f"Several closed-orders files for year(s) {repeated}; quantities summed.")
 
-        except Exception as e:
-            logging.error(f"Error processing {filename}: {e}")
+        # Pivot to wide 'Order Qty <year>' columns and merge into df exactly once
+        wide = long.pivot_table(
+            index=['Bill To Name Short', 'Model'],
+            columns='Year',
+            values='Order Qty',
+            aggfunc='sum',
+            fill_value=0
+        )
+        qty_year_cols = [f"Order Qty {year}" for year in wide.columns]
+        # Merge on code_key() text so int/str key dtypes never clash
+        merge_keys = ['_short_key', '_model_key']
+        wide = wide.reset_index()
+        wide.columns = merge_keys + qty_year_cols
+        df = df.drop(columns=[c for c in qty_year_cols if c in df.columns])
+        df['_short_key'] = df['Bill To Name Short'].map(code_key)
+        df['_model_key'] = df['Product Code SPMS'].map(code_key)
+        df = df.merge(wide, how='left', on=merge_keys).drop(columns=merge_keys)
+        df[qty_year_cols] = df[qty_year_cols].fillna(0).astype(int)
+        logging.info(f"Merged closed-orders for years {list(wide.columns[2:])}.")
 
     # Sum across all Order Qty columns
     qty_cols = [c for c in df.columns if c.startswith('Order Qty ')]
     df['Total Closed Orders'] = df[qty_cols].sum(axis=1)
 
+    # Quantity ordered inside each row's promotion window (dated files only)
+    window_cols = {'Promotion Start Date', 'Promotion End Date'}
+    if dailies and window_cols.issubset(df.columns):
+        index = OrderDateIndex(pd.concat(dailies, ignore_index=True))
+        df['Promo Window Orders'] = index.window_totals(
+            df['Bill To Name Short'],
+            df['Product Code SPMS'].map(code_key),
+            parse_yyyymmdd(df['Promotion Start Date']),
+            parse_yyyymmdd(df['Promotion End Date'])
+        ).astype(int)
+        logging.info("Summed closed orders over each promotion window.")
+
     logging.info("Finished merge_closed_orders.")
+    if return_detail:
+        detail = ClosedOrdersDetail(
+            pd.concat(details, ignore_index=True) if details
+            else pd.DataFrame(columns=ClosedOrdersDetail.KEYS),
+            columns_by_year
+        )
+        return df, detail
     return df
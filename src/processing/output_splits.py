@@ -4,16 +4,19 @@ import os
 from datetime import datetime
 import pandas as pd
 from src.utils.string_utils import sanitize_filename
+from src.utils.date_utils import render_weeks_range
+from src.processing.tracker import PreparedTracker
 from src.output.formatter import format_workbook
 from src.output.formatter import format_workbook
 from src.output.enhancements import add_closed_orders_by_year
 def split_by_bebs(
     cleaned_df: pd.DataFrame,
-    tracker_part6_df: pd.DataFrame,  # formerly old_tracker_df
+    tracker_part6_df,                # PreparedTracker (or raw combined tracker frame)
     tracker_part5_df: pd.DataFrame,  # your new Part 5
     spms_df: pd.DataFrame,
     output_folder: str,
-    prefix: str = 'CLAIM'
+    prefix: str = 'CLAIM',
+    closed_orders=None               # ClosedOrdersDetail from merge_closed_orders
 ):
     """
     For each unique BEBS code in cleaned_df:
@@ -22,16 +25,13 @@ def split_by_bebs(
       3. Sheet "Tracker": old_tracker rows matching customer–model
       4. Sheet "SPMS": SPMS rows for those promotions, with BEBS in column A
       5. Apply workbook styling via format_workbook()
+      6. One closed-orders sheet per year, looked up in `closed_orders`
     """
     user = os.getlogin()
     ts   = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        # copy the incoming Part 6 tracker and build the Customer-Short key
-    tracker = tracker_part6_df.copy()
-    tracker['Customer Short'] = tracker['Customer']\
-                                   .fillna('')\
-                                   .astype(str)\
-                                   .str[:12]\
-                                   .str.upper()
+    # reuse the run's prepared tracker (Customer-Short keys + hash index)
+    tracker = (tracker_part6_df if isinstance(tracker_part6_df, PreparedTracker)
+               else PreparedTracker(tracker_part6_df))
 
     for bebs in cleaned_df['BEBS'].dropna().unique():
         subset = cleaned_df[cleaned_df['BEBS'] == bebs]
@@ -44,21 +44,12 @@ def split_by_bebs(
 
         # 1) VERIFICATION sheet
         with pd.ExcelWriter(path, engine='openpyxl') as writer:
-            subset.to_excel(writer, index=False, sheet_name='VERIFICATION')
+            render_weeks_range(subset).to_excel(writer, index=False, sheet_name='VERIFICATION')
 
                 # 2) Part 6 sheet (formerly “Tracker”)
         pairs = subset[['Bill To Name Short','Product Code SPMS']].drop_duplicates()
-        # join against the enriched tracker copy (with its Customer-Short column)
-        part6_filtered = (
-            tracker
-            .merge(
-                pairs.rename(columns={
-                    'Bill To Name Short':'Customer Short',
-                    'Product Code SPMS':'Model'
-                }),
-                on=['Customer Short','Model'], how='inner'
-            )
-        )
+        # hash-index lookup on (Customer Short, Model) in the prepared tracker
+        part6_filtered = tracker.select(pairs.itertuples(index=False, name=None))
         with pd.ExcelWriter(path, engine='openpyxl', mode='a') as writer:
             part6_filtered.to_excel(
                 writer, index=False, sheet_name='Part 6'
@@ -98,6 +89,7 @@ def split_by_bebs(
         add_closed_orders_by_year(
             workbook_path=path,
             subset=subset,
+            closed_orders=closed_orders,
             date_col='Order Date'   # adjust this if your date column has a different header
         )
 
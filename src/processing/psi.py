@@ -1,15 +1,127 @@
 # src/processing/psi.py
 
 import logging
+
+import numpy as np
 import pandas as pd
-from src.utils.string_utils import extract_short_name
+from src.utils.prefix_index import PrefixIndex
+from src.utils.date_utils import week_label_to_ordinal
+from src.processing.dedup import enrich_by_unique_keys
+import config.config as cfg
+
+def resolve_psi_weeks(psi_df: pd.DataFrame, metadata_cols: int = 6) -> list:
+    """
+    Map the PSI weekly headers (every column after the first `metadata_cols`
+    metadata columns) to week ordinals. Returns (column position, ordinal)
+    pairs for the headers that parse as week labels.
+    """
+    weekly = [(pos, week_label_to_ordinal(col))
+              for pos, col in enumerate(psi_df.columns) if pos >= metadata_cols]
+    return [(pos, o) for pos, o in weekly if o is not None]
+
+
+class PsiCube:
+    """
+    PSI weekly values as a dense (channel, model) × measure × week array with
+    cumulative sums along the week axis, so any contiguous week window is
+    two lookups and a subtraction.
+
+    Attributes
+    ----------
+    pairs : pd.DataFrame
+        One row per distinct (upper-cased channel, model) with columns
+        '_pair', '_channel', '_model'; '_pair' indexes the cube's first axis.
+    measures : list[str]
+        Measure names along the second axis.
+    first_week : int
+        Week ordinal of the first slot on the week axis.
+    """
+
+    def __init__(self, psi_df: pd.DataFrame, measures: list):
+        self.measures = list(measures)
+        psi = psi_df[psi_df['Measure'].isin(self.measures)]
+        weekly = resolve_psi_weeks(psi_df)
+        ordinals = np.array([o for _, o in weekly], dtype=np.int64)
+        self.first_week = int(ordinals.min()) if len(ordinals) else 0
+        n_weeks = int(ordinals.max()) - self.first_week + 1 if len(ordinals) else 0
+
+        channel = psi['Channel'].astype(object).fillna('').astype(str).str.upper()
+        model = psi['Model.Suffix'].astype(str)
+        pair_codes, pair_index = pd.factorize(pd.MultiIndex.from_arrays([channel, model]))
+        self.pairs = pd.DataFrame({
+            '_pair': np.arange(len(pair_index)),
+            '_channel': pair_index.get_level_values(0),
+            '_model': pair_index.get_level_values(1),
+        })
+        # Pairs indexed by (model, channel): the model code is a fixed-width
+        # prefix, so one probe per (model, short) only reaches that model's channels
+        # (separator \x01, not NUL: pandas hashes strings only up to a NUL)
+        self._models = pd.Index(pair_index.get_level_values(1).unique())
+        model_codes = self._models.get_indexer(self.pairs['_model'])
+        self._by_model_channel = PrefixIndex(
+            [f"{code:09d}\x01{ch}" for code, ch in zip(model_codes, self.pairs['_channel'])]
+        )
+        measure_codes = pd.Index(self.measures).get_indexer(psi['Measure'])
+
+        grid = psi.iloc[:, [pos for pos, _ in weekly]]
+        values = (grid.set_axis(range(grid.shape[1]), axis=1)
+                      .apply(pd.to_numeric, errors='coerce')
+                      .fillna(0)
+                      .to_numpy(dtype=float))
+        dense = np.zeros((len(pair_index), len(self.measures), n_weeks))
+        # Several PSI lines (or duplicate headers) may land on one cell: accumulate
+        np.add.at(
+            dense,
+            (pair_codes[:, None], measure_codes[:, None], (ordinals - self.first_week)[None, :]),
+            values
+        )
+        self.cumulative = np.concatenate(
+            [np.zeros(dense.shape[:2] + (1,)), np.cumsum(dense, axis=2)], axis=2
+        )
+        logging.info(
+            f"PSI cube: {len(pair_index)} channel/model pairs × "
+            f"{len(self.measures)} measures × {n_weeks} weeks"
+        )
+
+    def match(self, shorts, models):
+        """
+        Expand every (position, pair id) whose model equals models[i] and
+        whose channel starts with shorts[i] (upper-cased shorts).
+
+        Returns
+        -------
+        (left, pair_ids) : tuple of np.ndarray
+            left[i] is a position in `shorts` / `models`.
+        """
+        model_codes = self._models.get_indexer(pd.Series(models).astype(str))
+        known = np.flatnonzero(model_codes >= 0)
+        shorts = pd.Series(shorts).fillna('').astype(str).to_numpy(dtype=object)
+        prefixes = [f"{model_codes[i]:09d}\x01{shorts[i]}" for i in known]
+        left, pair_ids = self._by_model_channel.matches(prefixes)
+        return known[left], pair_ids
+
+    def window_sums(self, pair_ids, start, end) -> np.ndarray:
+        """
+        Sum of every measure over weeks [start, end] (inclusive ordinals) for
+        each pair id. Returns an array of shape (len(pair_ids), n_measures).
+        """
+        n_weeks = self.cumulative.shape[2] - 1
+        lo = np.clip(np.asarray(start, dtype=np.int64) - self.first_week, 0, n_weeks)
+        hi = np.clip(np.asarray(end, dtype=np.int64) - self.first_week + 1, 0, n_weeks)
+        hi = np.maximum(hi, lo)
+        pair_ids = np.asarray(pair_ids, dtype=np.intp)
+        return self.cumulative[pair_ids, :, hi] - self.cumulative[pair_ids, :, lo]
+
 
 def enrich_psi_data(
     claim_df: pd.DataFrame,
     psi_df: pd.DataFrame,
     promo_key: str = 'Promotion No',
     cust_short_key: str = 'Bill To Name Short',
-    prod_key: str = 'Product Code SPMS'
+    prod_key: str = 'Product Code SPMS',
+    dedup: bool = False,
+    measures: list = None,
+    workers: int = 1
 ) -> pd.DataFrame:
     """
     Enrich the claim DataFrame with SELL-OUT, SELL-IN, and INVENTORY values
@@ -19,7 +131,8 @@ def enrich_psi_data(
     ----------
     claim_df : pd.DataFrame
         The DataFrame coming out of merge_closed_orders(),
-        must include cust_short_key, prod_key, and "Week's range".
+        must include cust_short_key, prod_key, and the promotion window as
+        'Week Start Ordinal' / 'Week End Ordinal'.
     psi_df : pd.DataFrame
         Raw PSI DataFrame, expected to have columns:
         ['Channel', 'Model.Suffix', 'Measure', <weekly cols...>]
@@ -29,12 +142,37 @@ def enrich_psi_data(
         Column in claim_df with the 12-char short customer name.
     prod_key : str
         Column in claim_df with the product code to match PSI 'Model.Suffix'.
+    dedup : bool
+        Compute once per distinct (customer, product, week window) and
+        broadcast the results back to the claim rows.
+    measures : list[tuple[str, str]]
+        (PSI 'Measure' value, target column) pairs, all filled in a single
+        pass over the PSI cube. Defaults to config PSI_MEASURES.
+    workers : int
+        With more than one worker, claim rows are partitioned by customer
+        short and each partition is enriched against its own PSI slice in a
+        process pool (see enrich_psi_parallel).
 
     Returns
     -------
     pd.DataFrame
-        Copy of claim_df with three new columns: 'SELL-OUT', 'SELL-IN', 'INVENTORY'.
+        Copy of claim_df with one new column per measure
+        (by default 'SELL-OUT', 'SELL-IN', 'INVENTORY').
     """
+    measures = list(measures or cfg.PSI_MEASURES)
+    if dedup:
+        return enrich_by_unique_keys(
+            claim_df,
+            [cust_short_key, prod_key, 'Week Start Ordinal', 'Week End Ordinal'],
+            lambda d: enrich_psi_data(d, psi_df, promo_key, cust_short_key, prod_key,
+                                      measures=measures, workers=workers),
+            [target_col for _, target_col in measures],
+            label='PSI enrichment'
+        )
+
+    if workers > 1:
+        return enrich_psi_parallel(claim_df, psi_df, workers, cust_short_key, prod_key, measures)
+
     df = claim_df.copy()
     logging.info("Starting PSI enrichment…")
 
@@ -43,58 +181,117 @@ def enrich_psi_data(
         logging.error("PSI enrichment skipped: 'Channel' or 'Model.Suffix' missing in PSI data")
         return df
 
-    # Determine weekly columns (assume first 6 cols are metadata)
-    weekly_cols = list(psi_df.columns[6:])
+    for _, target_col in measures:
+        df[target_col] = 0
 
-    # Define the measures and target column names
-    measures = [
-        ('Sell-Out FCST_KAM [R+F]', 'SELL-OUT'),
-        ('Sell-In FCST_KAM [R+F]', 'SELL-IN'),
-        ('Ch. Inventory_Sellable', 'INVENTORY'),
-    ]
+    # Build the prefix-sum cube once, with every configured measure on one axis
+    # (week headers resolved to ordinals here)
+    cube = PsiCube(psi_df, list(dict.fromkeys(m for m, _ in measures)))
+    if cube.cumulative.shape[2] <= 1:
+        logging.warning("PSI enrichment: no week columns recognised in PSI header")
+        return df
 
-    for measure_name, target_col in measures:
-        logging.info(f"Enriching '{target_col}' using measure '{measure_name}'")
-        # Filter PSI for this measure
-        psi_subset = psi_df[psi_df['Measure'] == measure_name].copy()
+    # 1) Distinct claim keys (customer short, model, week window)
+    start_col, end_col = 'Week Start Ordinal', 'Week End Ordinal'
+    keys = pd.DataFrame({
+        '_cust': df[cust_short_key].fillna('').astype(str) if cust_short_key in df.columns else '',
+        '_model': df[prod_key] if prod_key in df.columns else None,
+        '_start': df[start_col] if start_col in df.columns else None,
+        '_end': df[end_col] if end_col in df.columns else None,
+    }, index=df.index)
+    valid = (
+        (keys['_cust'] != '') & keys['_model'].notna() & (keys['_model'].astype(str) != '')
+        & keys['_start'].notna() & keys['_end'].notna()
+    )
+    keys = keys[valid].astype({'_model': str, '_start': 'int64', '_end': 'int64'})
+    distinct = keys.drop_duplicates().reset_index(drop=True)
+    distinct['_key'] = np.arange(len(distinct))
 
-        # Initialize target column
-        df[target_col] = 0
+    # 2) One (model, channel-prefix) probe per distinct key: only that model's
+    #    channels are expanded
+    left, pair_ids = cube.match(distinct['_cust'], distinct['_model'])
+    cand = distinct.iloc[left].assign(_pair=pair_ids)
 
-        # Iterate rows to sum relevant weeks
-        for idx, row in df.iterrows():
-            cust = row.get(cust_short_key, '')
-            prod = row.get(prod_key, '')
-            weeks_range = row.get("Week's range", '')
-
-            if not weeks_range or not cust or not prod:
-                continue
-
-            # Parse labels, only keep those actually in PSI
-            labels = [w for w in weeks_range.split(', ') if w in weekly_cols]
-            if not labels:
-                continue
-
-            # Filter by channel & model
-            matched = psi_subset[
-                psi_subset['Channel']
-                    .fillna('')
-                    .str.upper()
-                    .str.startswith(cust)
-                &
-                (psi_subset['Model.Suffix'] == prod)
-            ]
-            if matched.empty:
-                continue
-
-            # Sum across the selected weekly columns
-            try:
-                total = matched[labels].sum(axis=1).sum()
-                df.at[idx, target_col] = total
-            except KeyError as e:
-                logging.warning(f"Some week columns not found for {target_col}: {e}")
+    # 3) Window sums from the cube, accumulated per key
+    sums = np.zeros((len(distinct), len(cube.measures)))
+    np.add.at(sums, cand['_key'].to_numpy(),
+              cube.window_sums(cand['_pair'], cand['_start'], cand['_end']))
 
+    # 4) Broadcast the key sums back to the claim rows
+    row_keys = keys.merge(distinct, on=['_cust', '_model', '_start', '_end'], how='left')['_key']
+    for measure_name, target_col in measures:
+        per_key = pd.Series(sums[:, cube.measures.index(measure_name)])
+        totals = row_keys.map(per_key).fillna(0).to_numpy()
+        if (totals % 1 == 0).all():
+            totals = totals.astype(int)
+        df.loc[keys.index, target_col] = totals
         logging.info(f"Finished enriching '{target_col}'")
 
     logging.info("All PSI measures enriched.")
     return df
+
+
+def _enrich_psi_partition(args) -> pd.DataFrame:
+    """Process-pool worker: enrich one customer partition in-process."""
+    claim_part, psi_part, cust_short_key, prod_key, measures = args
+    return enrich_psi_data(claim_part, psi_part, cust_short_key=cust_short_key,
+                           prod_key=prod_key, measures=measures)
+
+
+def enrich_psi_parallel(
+    claim_df: pd.DataFrame,
+    psi_df: pd.DataFrame,
+    workers: int,
+    cust_short_key: str = 'Bill To Name Short',
+    prod_key: str = 'Product Code SPMS',
+    measures: list = None
+) -> pd.DataFrame:
+    """
+    Parallel enrich_psi_data(): split claim rows by `cust_short_key` into at
+    most `workers` partitions of similar size, give each the PSI rows whose
+    Channel starts with one of its shorts, enrich the partitions in a
+    ProcessPoolExecutor and reassemble them in the original row order.
+
+    Partitioning is deterministic (shorts sorted, assigned greedily by row
+    count), so the output does not depend on worker scheduling.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if 'Channel' not in psi_df.columns or cust_short_key not in claim_df.columns:
+        return enrich_psi_data(claim_df, psi_df, cust_short_key=cust_short_key,
+                               prod_key=prod_key, measures=measures)
+
+    shorts = claim_df[cust_short_key].fillna('').astype(str)
+    sizes = shorts.value_counts().sort_index()
+    loads = [0] * workers
+    bucket_of = {}
+    for short, count in sorted(sizes.items(), key=lambda kv: (-kv[1], kv[0])):
+        target = loads.index(min(loads))
+        bucket_of[short] = target
+        loads[target] += count
+    buckets = shorts.map(bucket_of).to_numpy()
+
+    channels = PrefixIndex(psi_df['Channel'])
+    tasks = []
+    for b in range(workers):
+        rows = np.flatnonzero(buckets == b)
+        if not len(rows):
+            continue
+        # Empty shorts never match a channel, so they add no PSI rows
+        hits = [channels.rows(s) for s, k in sorted(bucket_of.items()) if k == b and s]
+        psi_rows = np.unique(np.concatenate(hits)) if hits else np.zeros(0, dtype=np.intp)
+        tasks.append((rows, (claim_df.iloc[rows], psi_df.iloc[psi_rows],
+                             cust_short_key, prod_key, measures)))
+
+    logging.info(
+        f"PSI enrichment: {len(claim_df)} rows in {len(tasks)} customer partitions "
+        f"across {workers} workers"
+    )
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_enrich_psi_partition, [args for _, args in tasks]))
+
+    order = np.concatenate([rows for rows, _ in tasks]) if tasks else np.zeros(0, dtype=np.intp)
+    combined = pd.concat(parts) if parts else claim_df.copy()
+    position = np.empty(len(order), dtype=np.intp)
+    position[order] = np.arange(len(order))
+    return combined.iloc[position]
@@ -1,19 +1,171 @@
 # src/processing/tracker.py
 
 import logging
+import numpy as np
 import pandas as pd
 
-from src.utils.string_utils import extract_short_name
+from src.utils.prefix_index import PrefixIndex
+from src.processing.dedup import enrich_by_unique_keys
+import config.config as cfg
+
+def ingest_trackers(parts: dict, aliases: dict = None) -> pd.DataFrame:
+    """
+    Combine tracker inputs into one compact frame.
+
+    Each tracker's headers are mapped onto the canonical columns in
+    `aliases` (default config TRACKER_COLUMN_ALIASES), every other column is
+    dropped before the concat, and 'Source' / 'Source Row' record the input
+    key and row position, so full rows can be recovered from the raw frames
+    for export (see PreparedTracker(sources=...)).
+    Customer, Model and Source become categoricals; Claim Volume is numeric
+    float64 (summed, then truncated to int, so float32 rounding would leak
+    into 'Tracker').
+    Trackers lacking a canonical column are logged and skipped.
+
+    Parameters
+    ----------
+    parts : dict[str, pd.DataFrame]
+        Input key (e.g. 'TRACKER_HA') → raw tracker frame.
+    """
+    aliases = aliases or cfg.TRACKER_COLUMN_ALIASES
+    projected = []
+    for source, raw in parts.items():
+        headers = {str(c).strip().lower(): c for c in raw.columns}
+        mapping = {}
+        for canonical, names in aliases.items():
+            found = next((headers[n.lower()] for n in names if n.lower() in headers), None)
+            if found is not None:
+                mapping[canonical] = found
+        missing = [c for c in aliases if c not in mapping]
+        if missing:
+            logging.warning(f"Tracker {source}: no column for {missing}; skipping it.")
+            continue
+        part = pd.DataFrame({canonical: raw[col].to_numpy() for canonical, col in mapping.items()})
+        part['Source'] = source
+        part['Source Row'] = np.arange(len(part), dtype=np.int32)
+        projected.append(part)
+        logging.info(f"Tracker {source}: {len(raw)} rows, kept {len(mapping)} of {raw.shape[1]} columns")
+
+    if not projected:
+        return pd.DataFrame(columns=list(aliases) + ['Source', 'Source Row'])
+    combined = pd.concat(projected, ignore_index=True)
+    for col in ('Customer', 'Model', 'Source'):
+        if col in combined.columns:
+            combined[col] = combined[col].astype('category')
+    if 'Claim Volume' in combined.columns:
+        combined['Claim Volume'] = pd.to_numeric(
+            combined['Claim Volume'], errors='coerce'
+        ).astype('float64')
+    return combined
+
+
+class PreparedTracker:
+    """
+    Combined tracker frame normalised once per run and shared by
+    enrich_tracker_data() and split_by_bebs().
+
+    Holds the upper-cased customer key and its 12-char 'Customer Short',
+    numeric volumes, a hash index (Customer Short, Model) → row positions, and
+    the volumes pre-aggregated by (upper-cased customer, model) behind a
+    PrefixIndex for "customer starts with short name" sums.
+
+    When built from ingest_trackers() output, `sources` (input key → raw
+    tracker frame) lets select() return the full raw rows for export while
+    enrichment only ever touches the narrow frame.
+    """
+
+    def __init__(
+        self,
+        tracker_df: pd.DataFrame,
+        customer_col: str = 'Customer',
+        model_col: str = 'Model',
+        volume_col: str = 'Claim Volume',
+        sources: dict = None
+    ):
+        self.frame = tracker_df
+        self.sources = sources
+        self.customer_col = customer_col
+        self.model_col = model_col
+        self.volume_col = volume_col
+
+        if {customer_col, model_col, volume_col} - set(tracker_df.columns):
+            if not tracker_df.empty:
+                logging.warning("Tracker data missing customer/model/volume columns; Tracker set to 0.")
+            self.customer = pd.Series('', index=tracker_df.index, dtype=object)
+            self.model = pd.Series(None, index=tracker_df.index, dtype=object)
+            self.volume = pd.Series(0.0, index=tracker_df.index)
+        else:
+            self.customer = tracker_df[customer_col].astype(object).fillna('').astype(str).str.upper()
+            self.model = tracker_df[model_col]
+            self.volume = pd.to_numeric(tracker_df[volume_col], errors='coerce').fillna(0)
+        self.customer_short = self.customer.str[:12]
+
+        keys = pd.DataFrame({'_short': self.customer_short.to_numpy(),
+                             '_model': self.model.to_numpy()})
+        self.rows_by_key = keys.groupby(['_short', '_model'], sort=False).indices
+
+        agg = (
+            pd.DataFrame({'_cust': self.customer.to_numpy(), '_model': self.model.to_numpy(),
+                          '_volume': self.volume.to_numpy()})
+            .groupby(['_cust', '_model'], sort=False, dropna=False)['_volume']
+            .sum()
+            .reset_index()
+        )
+        self.customers = PrefixIndex(agg['_cust'])
+        self.agg_models = agg['_model'].to_numpy(dtype=object)
+        self.agg_volumes = agg['_volume'].to_numpy(dtype=float)
+        logging.info(f"Prepared tracker: {len(tracker_df)} rows, {len(agg)} customer/model groups")
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def rows_for(self, pairs) -> np.ndarray:
+        """Ascending row positions for an iterable of (Customer Short, Model) pairs."""
+        hits = [self.rows_by_key[key] for key in pairs if key in self.rows_by_key]
+        return np.unique(np.concatenate(hits)) if hits else np.zeros(0, dtype=np.intp)
+
+    def select(self, pairs) -> pd.DataFrame:
+        """
+        Tracker rows for the given pairs, with their 'Customer Short' column.
+        With `sources`, these are the full raw rows (all tracker columns, in
+        input order) rather than the narrow enrichment frame.
+        """
+        rows = self.rows_for(pairs)
+        if self.sources is None:
+            out = self.frame.iloc[rows].copy()
+        else:
+            picked = self.frame.iloc[rows]
+            parts = [
+                self.sources[source].iloc[group['Source Row'].to_numpy()]
+                for source, group in picked.groupby('Source', sort=False, observed=True)
+            ]
+            out = (pd.concat(parts, ignore_index=True) if parts
+                   else pd.DataFrame(columns=self.frame.columns))
+        out['Customer Short'] = self.customer_short.iloc[rows].to_numpy()
+        return out
+
+    def prefix_volumes(self, shorts, models) -> np.ndarray:
+        """
+        For each (short, model) pair, the summed volume of tracker rows whose
+        upper-cased customer starts with short and whose model equals model.
+        """
+        left, right = self.customers.matches(shorts)
+        same_model = self.agg_models[right] == np.asarray(models, dtype=object)[left]
+        totals = np.zeros(len(shorts))
+        np.add.at(totals, left[same_model], self.agg_volumes[right[same_model]])
+        return totals
+
 
 def enrich_tracker_data(
     claim_df: pd.DataFrame,
-    tracker_df: pd.DataFrame,
+    tracker_df,
     cust_short_key: str = 'Bill To Name Short',
     prod_key: str = 'Product Code SPMS',
     tracker_customer_col: str = 'Customer',
     tracker_model_col: str = 'Model',
     tracker_volume_col: str = 'Claim Volume',
-    claim_qty_col: str = 'Q'
+    claim_qty_col: str = 'Q',
+    dedup: bool = False
 ) -> pd.DataFrame:
     """
     Enrich the DataFrame with old‐tracker sums and compute check columns.
@@ -28,8 +180,9 @@ def enrich_tracker_data(
         - cust_short_key (12-char customer)
         - prod_key (product code)
         - 'SELL-OUT', 'SELL-IN', 'INVENTORY', 'Total Closed Orders', and claim_qty_col
-    tracker_df : pd.DataFrame
-        Raw tracker data, expected to have:
+    tracker_df : PreparedTracker or pd.DataFrame
+        Tracker prepared once by the caller, or raw tracker data (prepared
+        here) expected to have:
         - tracker_customer_col (full customer name)
         - tracker_model_col    (model code)
         - tracker_volume_col   (numeric volumes)
@@ -45,6 +198,9 @@ def enrich_tracker_data(
         Column in tracker_df with the numeric claim volumes.
     claim_qty_col : str
         Column in claim_df with the original claim quantity ('Q').
+    dedup : bool
+        Sum tracker volumes once per distinct (customer, model) and broadcast
+        the 'Tracker' value back to the claim rows.
 
     Returns
     -------
@@ -57,37 +213,38 @@ def enrich_tracker_data(
         - 'ID PSI CHECK'
     """
     df = claim_df.copy()
-    tdf = tracker_df.copy()
     logging.info("Starting tracker enrichment…")
 
-    # Prepare tracker_df: 12-char key and numeric volumes
-    tdf['Customer Short'] = (
-        tdf[tracker_customer_col]
-        .fillna('')
-        .apply(lambda x: extract_short_name(x, 12))
-    )
-    tdf[tracker_volume_col] = pd.to_numeric(
-        tdf[tracker_volume_col], errors='coerce'
-    ).fillna(0)
-
-    # Summarize by keys
-    # Initialize the Tracker column
-    df['Tracker'] = 0
-
-    # For each row, sum any tracker_df rows whose Customer startswith our short name
-    for idx, row in df.iterrows():
-        cust = str(row[cust_short_key]).upper()
-        prod = row[prod_key]
-        mask = (
-            tdf[tracker_customer_col]
-                .fillna('')
-                .str.upper()
-                .str.startswith(cust)
-            &
-            (tdf[tracker_model_col] == prod)
+    tracker = (tracker_df if isinstance(tracker_df, PreparedTracker)
+               else PreparedTracker(tracker_df, tracker_customer_col,
+                                    tracker_model_col, tracker_volume_col))
+
+    def _tracker_column(frame: pd.DataFrame) -> pd.DataFrame:
+        out = frame.copy()
+        # Sum the aggregated volumes whose customer starts with the row's short
+        # name and whose model matches, probing each distinct key once
+        keys = pd.DataFrame({
+            '_cust': out[cust_short_key].map(str).str.upper(),
+            '_model': out[prod_key],
+        })
+        codes = keys.groupby(['_cust', '_model'], sort=False, dropna=False).ngroup().to_numpy()
+        first = ~pd.Series(codes).duplicated().to_numpy()
+        distinct = keys[first]
+        slot = np.empty(codes.max() + 1 if len(codes) else 0, dtype=np.intp)
+        slot[codes[first]] = np.arange(len(distinct))
+        codes = slot[codes]
+
+        totals = tracker.prefix_volumes(distinct['_cust'].to_numpy(), distinct['_model'].to_numpy())
+        out['Tracker'] = totals[codes].astype(int) if len(codes) else 0
+        return out
+
+    if dedup:
+        df = enrich_by_unique_keys(
+            df, [cust_short_key, prod_key], _tracker_column, ['Tracker'],
+            label='Tracker enrichment'
         )
-        total_volume = tdf.loc[mask, tracker_volume_col].sum()
-        df.at[idx, 'Tracker'] = int(total_volume)
+    else:
+        df = _tracker_column(df)
 
     # Compute check columns
     # Ensure claim_qty_col exists
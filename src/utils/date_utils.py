@@ -1,6 +1,12 @@
-import pandas as pd
+import re
+from functools import lru_cache
 from datetime import datetime
 
+import pandas as pd
+
+# Week ordinals count Mondays from this epoch (itself a Monday, ordinal 0)
+WEEK_EPOCH = pd.Timestamp('1970-01-05')
+
 def date_to_week(date_str: str) -> int:
     """
     Convert a YYYYMMDD string (or int) into an ISO week number.
@@ -37,3 +43,121 @@ def generate_weeks_range_monday(start_date: str, end_date: str) -> list[str]:
         weeks.append(label)
         current += pd.Timedelta(weeks=1)
     return weeks
+
+# ─── Batch (vectorized) counterparts ──────────────────────────────────────────
+
+def parse_yyyymmdd(values) -> pd.Series:
+    """
+    Parse a Series of YYYYMMDD strings (or ints) in one pass.
+    Invalid or missing values become NaT instead of raising.
+    """
+    values = pd.Series(values)
+    return pd.to_datetime(values.astype(str), format='%Y%m%d', errors='coerce')
+
+def excel_dates(values) -> pd.Series:
+    """
+    Parse raw Excel date cells in one pass. Numbers are Excel day serials
+    (what pyxlsb returns for date cells), anything else goes through
+    pd.to_datetime; unparseable values become NaT.
+    """
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    numeric = values.map(
+        lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)
+    ).astype(bool)
+    out = pd.to_datetime(values.where(~numeric), errors='coerce')
+    if numeric.any():
+        serials = pd.to_numeric(values[numeric], errors='coerce').astype(float)
+        out[numeric] = pd.to_datetime(serials, unit='D', origin='1899-12-30', errors='coerce')
+    return out
+
+def dates_to_weeks(values) -> pd.Series:
+    """
+    Vectorized date_to_week(): ISO week numbers, 0 where the date is invalid.
+    """
+    dt = parse_yyyymmdd(values)
+    return dt.dt.isocalendar()['week'].fillna(0).astype(int)
+
+def dates_to_years(values, iso: bool = False) -> pd.Series:
+    """
+    Vectorized date_to_year(): four-digit calendar years (ISO years if `iso`),
+    0 where the date is invalid.
+    """
+    dt = parse_yyyymmdd(values)
+    years = dt.dt.isocalendar()['year'] if iso else dt.dt.year
+    return years.fillna(0).astype(int)
+
+def week_start_mondays(values) -> pd.Series:
+    """
+    Vectorized Monday-of-week for YYYYMMDD values (NaT where invalid),
+    as used by generate_weeks_range_monday().
+    """
+    dt = parse_yyyymmdd(values)
+    return dt - pd.to_timedelta(dt.dt.weekday, unit='D')
+
+# ─── Integer week calendar ────────────────────────────────────────────────────
+
+_WEEK_LABEL_RE = re.compile(r'^\s*(\d{2})-(\d{2})-(\d{2})\s*\(W\d{1,2}\)\s*$')
+
+def week_ordinals(values) -> pd.Series:
+    """
+    Vectorized YYYYMMDD → week ordinal (whole weeks between WEEK_EPOCH and the
+    date's Monday). Nullable Int64, <NA> where the date is invalid.
+    """
+    mondays = week_start_mondays(values)
+    return ((mondays - WEEK_EPOCH).dt.days // 7).astype('Int64')
+
+@lru_cache(maxsize=None)
+def week_label(ordinal: int) -> str:
+    """
+    Render a week ordinal as the "YY-MM-DD\n(Www)" label used for PSI headers.
+    """
+    monday = WEEK_EPOCH + pd.Timedelta(weeks=int(ordinal))
+    return f"{monday.strftime('%y-%m-%d')}\n(W{monday.isocalendar()[1]})"
+
+def week_label_to_ordinal(label):
+    """
+    Parse a "YY-MM-DD\n(Www)" week label (as built by week_label) back into
+    its week ordinal. Returns None for anything else: non-text headers such
+    as dates, and labels whose date is not a Monday. Those never matched a
+    generated week label, so they are not rolled onto a week.
+    """
+    if not isinstance(label, str):
+        return None
+    m = _WEEK_LABEL_RE.match(label)
+    if not m:
+        return None
+    monday = pd.to_datetime(''.join(m.groups()), format='%y%m%d', errors='coerce')
+    if pd.isna(monday) or monday.weekday() != 0:
+        return None
+    return (monday - WEEK_EPOCH).days // 7
+
+def week_range_labels(start_ordinal, end_ordinal) -> list[str]:
+    """
+    Labels for every week from start_ordinal to end_ordinal inclusive; the
+    same list generate_weeks_range_monday() builds from the dates.
+    """
+    if pd.isna(start_ordinal) or pd.isna(end_ordinal):
+        return []
+    return [week_label(o) for o in range(int(start_ordinal), int(end_ordinal) + 1)]
+
+def render_weeks_range(
+    df: pd.DataFrame,
+    start_col: str = 'Week Start Ordinal',
+    end_col: str = 'Week End Ordinal'
+) -> pd.DataFrame:
+    """
+    Return a copy of df for export: the two week-ordinal columns are replaced by
+    the comma-joined "Week's range" label string, at the same position.
+    """
+    if start_col not in df.columns or end_col not in df.columns:
+        return df
+    out = df.copy()
+    pairs = out[[start_col, end_col]].astype('Int64')
+    rendered = {
+        (s, e): ', '.join(week_range_labels(s, e))
+        for s, e in pairs.drop_duplicates().itertuples(index=False)
+    }
+    position = out.columns.get_loc(start_col)
+    out.insert(position, "Week's range",
+               [rendered[(s, e)] for s, e in pairs.itertuples(index=False)])
+    return out.drop(columns=[start_col, end_col])
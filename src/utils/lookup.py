@@ -2,9 +2,14 @@
 """
 Lookup dictionary creation and lookup functions for SPMS data.
 """
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
 from typing import Any, Dict, List
 import logging
 
+import numpy as np
+import pandas as pd
+
 def create_lookup_dict(
     df,
     key_col: str,
@@ -39,6 +44,147 @@ def create_lookup_dict(
     return grouped
 
 
+
+class _RecordView(Mapping):
+    """Read-only dict-like view of one row of a ColumnarLookup."""
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: 'ColumnarLookup', row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, field: str) -> Any:
+        if field not in self._store.columns:
+            raise KeyError(field)
+        return self._store._value(field, self._row)
+
+    def __iter__(self):
+        return iter(self._store.fields)
+
+    def __len__(self) -> int:
+        return len(self._store.fields)
+
+
+class _RecordSlice(Sequence):
+    """The records of one key: a contiguous [offset, offset + length) slice."""
+    __slots__ = ('_store', '_offset', '_length')
+
+    def __init__(self, store: 'ColumnarLookup', offset: int, length: int):
+        self._store = store
+        self._offset = offset
+        self._length = length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._length))]
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError(i)
+        return _RecordView(self._store, self._offset + i)
+
+    def __len__(self) -> int:
+        return self._length
+
+
+class ColumnarLookup(Mapping):
+    """
+    Array-backed replacement for the dict-of-lists-of-dicts built by
+    create_lookup_dict().
+
+    Rows are stably sorted by key so each key's records form one contiguous
+    slice, addressed through a key → (offset, length) table. Numeric columns
+    are kept as NumPy arrays; everything else is factorized into int32 codes
+    plus a categories array. Behaves as a Mapping of key → sequence of
+    dict-like records, so lookup_value / lookup_customer / SpmsIndex accept it
+    unchanged.
+    """
+
+    def __init__(self, df, key_col: str, value_cols: List[str]):
+        self.fields = [col for col in value_cols if col in df.columns]
+        keys = df[key_col]
+        valid = keys.notna().to_numpy()
+        key_codes, uniques = pd.factorize(keys[valid])
+        order = np.argsort(key_codes, kind='stable')
+        counts = np.bincount(key_codes, minlength=len(uniques))
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(counts) else counts
+
+        self.slots: Dict[Any, tuple] = {
+            key: (int(off), int(cnt)) for key, off, cnt in zip(uniques, offsets, counts)
+        }
+        self.columns: Dict[str, Any] = {}
+        for col in self.fields:
+            values = df[col][valid].iloc[order]
+            # plain NumPy numerics only: nullable (Int32 …) columns are factorized
+            if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biufc':
+                self.columns[col] = values.to_numpy()
+            else:
+                codes, cats = pd.factorize(values)
+                self.columns[col] = (codes.astype(np.int32), np.asarray(cats, dtype=object))
+
+    def _value(self, field: str, row: int) -> Any:
+        column = self.columns[field]
+        if isinstance(column, tuple):
+            code = column[0][row]
+            return None if code < 0 else column[1][code]
+        return column[row].item()
+
+    def first_value(self, key: Any, field: str, default: Any = None) -> Any:
+        """Value of `field` in the first record for `key` (lookup_value fast path)."""
+        slot = self.slots.get(key)
+        if slot is None or not slot[1] or field not in self.columns:
+            return default
+        return self._value(field, slot[0])
+
+    def column(self, key: Any, field: str) -> list:
+        """All values of `field` for `key`, decoded from the contiguous slice."""
+        offset, length = self.slots.get(key, (0, 0))
+        column = self.columns[field]
+        if isinstance(column, tuple):
+            codes = column[0][offset:offset + length]
+            return [None if c < 0 else column[1][c] for c in codes]
+        return column[offset:offset + length].tolist()
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate size of the column arrays in bytes."""
+        total = 0
+        for column in self.columns.values():
+            if isinstance(column, tuple):
+                total += column[0].nbytes + column[1].nbytes
+            else:
+                total += column.nbytes
+        return total
+
+    def __getitem__(self, key: Any) -> _RecordSlice:
+        offset, length = self.slots[key]
+        return _RecordSlice(self, offset, length)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.slots
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+
+def create_lookup_store(
+    df,
+    key_col: str,
+    value_cols: List[str]
+) -> ColumnarLookup:
+    """
+    Columnar counterpart of create_lookup_dict(): same keys and record order,
+    stored as contiguous column arrays instead of per-row dicts.
+    """
+    missing = [col for col in value_cols if col not in df.columns]
+    if missing:
+        logging.warning(f"create_lookup_store: missing columns {missing}")
+    return ColumnarLookup(df, key_col, value_cols)
+
+
 def lookup_value(
     promo_no: Any,
     field_name: str,
@@ -48,6 +194,8 @@ def lookup_value(
     """
     Retrieve the first matching field value for a promotion number.
     """
+    if isinstance(lookup_dict, ColumnarLookup):
+        return lookup_dict.first_value(promo_no, field_name, default)
     records = lookup_dict.get(promo_no, [])
     if not records:
         return default
@@ -124,3 +272,178 @@ def lookup_SPGM(
     if not records:
         return default
     return records[0].get('Sales PGM NO', default)
+
+
+class _PromoEntry:
+    """
+    Per-promotion search structures over one list of SPMS records:
+    Bill To Names sorted for prefix search (with their record positions)
+    and a hash of Product Code → first record position.
+    """
+    __slots__ = ('records', 'names', 'positions', 'products')
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+        keyed = sorted(
+            (_as_text(r.get('Bill To Name', '')), pos) for pos, r in enumerate(records)
+        )
+        self.names = [name for name, _ in keyed]
+        self.positions = [pos for _, pos in keyed]
+        self.products: Dict[Any, int] = {}
+        for pos, r in enumerate(records):
+            self.products.setdefault(r.get('Product Code'), pos)
+
+    def first_with_prefix(self, prefix: str):
+        """Position of the first record whose Bill To Name starts with prefix, or None."""
+        if not prefix:
+            return 0 if self.records else None
+        lo = bisect_left(self.names, prefix)
+        hi = bisect_left(self.names, prefix + '\U0010FFFF', lo)
+        if lo >= hi:
+            return None
+        return min(self.positions[lo:hi])
+
+    def first_with_prefixes(self, short: str, full: str) -> tuple:
+        """
+        Positions of the first records whose Bill To Name starts with `short`
+        and with `full`, in one search: `full` extends `short`, so its run of
+        names lies inside the short run and is bisected within it.
+        """
+        if not self.records:
+            return None, None
+        lo = bisect_left(self.names, short)
+        hi = bisect_left(self.names, short + '\U0010FFFF', lo)
+        if lo >= hi:
+            return None, None
+        flo = bisect_left(self.names, full, lo, hi)
+        fhi = bisect_left(self.names, full + '\U0010FFFF', flo, hi)
+        return (min(self.positions[lo:hi]),
+                min(self.positions[flo:fhi]) if flo < fhi else None)
+
+    def first_with_product(self, product_code: Any):
+        """Position of the first record with this Product Code, or None."""
+        if not product_code:
+            return 0 if self.records else None
+        return self.products.get(product_code)
+
+
+def _as_text(value: Any) -> str:
+    return value if isinstance(value, str) else ''
+
+
+class SpmsIndex:
+    """
+    Indexed view over the primary (Report 1) and secondary (Report 7) SPMS
+    lookup dicts, built once per run.
+
+    Answers the same questions as lookup_customer / lookup_customer2 /
+    lookup_SPGM (including the fallback to the secondary dict) with a binary
+    search over sorted Bill To Names or a Product Code hash probe instead of a
+    linear scan of the promotion's records.
+    """
+
+    def __init__(
+        self,
+        lookup_dict: Dict[Any, List[Dict[str, Any]]],
+        secondary_lookup_dict: Dict[Any, List[Dict[str, Any]]] = None
+    ):
+        self.primary = {k: _PromoEntry(v) for k, v in (lookup_dict or {}).items()}
+        self.secondary = {k: _PromoEntry(v) for k, v in (secondary_lookup_dict or {}).items()}
+
+    @classmethod
+    def from_frames(
+        cls,
+        spms_df,
+        spms2_df=None,
+        key_col: str = 'Promotion No',
+        value_cols: List[str] = None,
+        secondary_value_cols: List[str] = None
+    ) -> 'SpmsIndex':
+        """
+        Build the index straight from the SPMS Report 1 / Report 7 frames.
+        """
+        import config.config as cfg
+        primary = create_lookup_dict(spms_df, key_col, value_cols or cfg.SPMS_FIELDS)
+        secondary = (
+            create_lookup_dict(spms2_df, key_col, secondary_value_cols or cfg.SPMS2_FIELDS)
+            if spms2_df is not None else {}
+        )
+        return cls(primary, secondary)
+
+    def __contains__(self, promo_no: Any) -> bool:
+        return promo_no in self.primary
+
+    def _probe(self, promo_no: Any, kind: str, value: Any):
+        """
+        Return the matching record from the primary entries, falling back to the
+        secondary ones, or None when neither holds a match.
+        """
+        for entries in (self.primary, self.secondary):
+            entry = entries.get(promo_no)
+            if entry is None:
+                continue
+            if kind == 'prefix':
+                pos = entry.first_with_prefix(value)
+            else:
+                pos = entry.first_with_product(value)
+            if pos is not None:
+                return entry.records[pos]
+        return None
+
+    def _probe_prefixes(self, promo_no: Any, short: str, full: str) -> tuple:
+        """
+        (_probe for prefix `short`, _probe for prefix `full`) with one search
+        per entry; `full` must start with `short`. Each falls back to the
+        secondary entries on its own.
+        """
+        found = [None, None]
+        for entries in (self.primary, self.secondary):
+            entry = entries.get(promo_no)
+            if entry is None:
+                continue
+            for i, pos in enumerate(entry.first_with_prefixes(short, full)):
+                if found[i] is None and pos is not None:
+                    found[i] = entry.records[pos]
+            if None not in found:
+                break
+        return tuple(found)
+
+    def lookup_customer(self, promo_no: Any, field_name: str,
+                        customer_name: str = None, default: Any = None) -> Any:
+        """Indexed equivalent of lookup_customer()."""
+        record = self._probe(promo_no, 'prefix', customer_name or '')
+        return default if record is None else record.get(field_name, default)
+
+    def lookup_product(self, promo_no: Any, field_name: str,
+                       product_code: str = None, default: Any = None) -> Any:
+        """Indexed equivalent of lookup_customer2()."""
+        record = self._probe(promo_no, 'product', product_code)
+        return default if record is None else record.get(field_name, default)
+
+    def lookup_spgm(self, promo_no: Any, bill_to_name: str, default: Any = None) -> Any:
+        """Indexed equivalent of lookup_SPGM()."""
+        record = self._probe(promo_no, 'prefix', bill_to_name or '')
+        return default if record is None else record.get('Sales PGM NO', default)
+
+    def lookup_all(self, promo_no: Any, customer: str = '', product: str = '') -> Dict[str, Any]:
+        """
+        Return every SPMS field enrich_claim_data() needs for one claim line,
+        or None when the promotion is not in the primary dict.
+        """
+        entry = self.primary.get(promo_no)
+        if entry is None or not entry.records:
+            return None
+        customer = customer or ''
+        head = entry.records[0]
+        # customer[:12] and the full name share one prefix search
+        by_short, by_name = self._probe_prefixes(promo_no, customer[:12], customer)
+        product_hit = self._probe(promo_no, 'product', product)
+        return {
+            'Cancel Flag': head.get('Cancel Flag'),
+            'Recreate Flag': head.get('Recreate Flag'),
+            'Promotion Start YYYYMMDD': head.get('Promotion Start YYYYMMDD'),
+            'Promotion End YYYYMMDD': head.get('Promotion End YYYYMMDD'),
+            'Bill To Name SPMS': None if by_short is None else by_short.get('Bill To Name'),
+            'Product Code SPMS': None if product_hit is None else product_hit.get('Product Code'),
+            'Sales PGM NO': None if by_name is None else by_name.get('Sales PGM NO'),
+        }
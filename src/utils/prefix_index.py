@@ -0,0 +1,63 @@
+# src/utils/prefix_index.py
+"""
+Sorted prefix index for "upper(name).startswith(short)" matching, shared by
+the steps that match 12-char customer shorts against PSI channels or
+tracker customers.
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Sorts after every character, so [prefix, prefix + _MAX_CHAR) spans all its extensions
+_MAX_CHAR = '\U0010FFFF'
+
+
+class PrefixIndex:
+    """
+    Upper-cased names sorted once; the rows whose name starts with a prefix
+    form one contiguous run found by two binary searches.
+
+    Prefixes are compared as given, so pass them upper-cased (as the
+    'Bill To Name Short' keys already are). An empty prefix matches every row.
+    """
+
+    def __init__(self, names):
+        text = pd.Series(names).astype(object).fillna('').astype(str).str.upper().to_numpy(dtype=object)
+        order = np.argsort(text, kind='stable')
+        self._sorted = text[order]
+        self._rows = order.astype(np.intp)
+        self._cache: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def rows(self, prefix: str) -> np.ndarray:
+        """Row ids (ascending) whose upper-cased name starts with `prefix`."""
+        prefix = '' if prefix is None else str(prefix)
+        hit = self._cache.get(prefix)
+        if hit is None:
+            lo = np.searchsorted(self._sorted, prefix, side='left')
+            hi = np.searchsorted(self._sorted, prefix + _MAX_CHAR, side='left')
+            hit = np.sort(self._rows[lo:hi])
+            self._cache[prefix] = hit
+        return hit
+
+    def matches(self, prefixes) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Expand every (prefix position, matching row id) pair for a sequence of
+        prefixes, probing each distinct prefix once.
+
+        Returns
+        -------
+        (left, right) : tuple of np.ndarray
+            left[i] is a position in `prefixes`, right[i] a row id of the index.
+        """
+        codes, uniques = pd.factorize(pd.Series(prefixes).fillna('').astype(str))
+        hits = [self.rows(p) for p in uniques]
+        counts = np.array([len(h) for h in hits], dtype=np.intp)[codes] if len(codes) \
+            else np.zeros(0, dtype=np.intp)
+        left = np.repeat(np.arange(len(codes)), counts)
+        right = (np.concatenate([hits[c] for c in codes]) if counts.sum()
+                 else np.zeros(0, dtype=np.intp))
+        return left, right
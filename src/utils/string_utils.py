@@ -1,4 +1,8 @@
 import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
 
 def sanitize_filename(name: str) -> str:
     """
@@ -6,12 +10,48 @@ def sanitize_filename(name: str) -> str:
     """
     return re.sub(r'[\\/*?:"<>|]', "_", str(name))
 
+def normalize_header(name):
+    """
+    Canonical form of a column header: NBSP → space, BOM removed, NFKC
+    unicode normalisation, surrounding whitespace stripped. Non-strings
+    (e.g. date headers) are returned unchanged.
+    """
+    if not isinstance(name, str):
+        return name
+    return unicodedata.normalize('NFKC', name.replace('\u00A0', ' ').replace('\ufeff', '')).strip()
+
 def extract_short_name(full_name: str, length: int = 12) -> str:
     """
     Return the first `length` characters of a name, uppercase and stripped.
     """
     return (str(full_name)[:length]).strip().upper()
 
+def code_key(value):
+    """
+    Canonical text of a code cell (e.g. a model), so a code read as a number
+    (1234 or 1234.0) matches the same code read as text ('1234'). Missing
+    values are returned unchanged.
+    """
+    if pd.isna(value):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def prefix_match(values: pd.Series, prefixes: pd.Series) -> np.ndarray:
+    """
+    Element-wise ``values[i].startswith(prefixes[i])`` without a Python loop.
+    Rows are bucketed by prefix length so each bucket is one sliced comparison.
+    """
+    values = values.astype(object).fillna('').astype(str).reset_index(drop=True)
+    prefixes = prefixes.astype(object).fillna('').astype(str).reset_index(drop=True)
+    lengths = prefixes.str.len()
+    out = np.zeros(len(prefixes), dtype=bool)
+    for length in lengths.unique():
+        mask = (lengths == length).to_numpy()
+        out[mask] = (values[mask].str[:length] == prefixes[mask]).to_numpy()
+    return out
+
 def truncate_middle(s: str, max_len: int = 30) -> str:
     """
     If `s` is longer than `max_len`, shorten it by replacing the middle with '…'.
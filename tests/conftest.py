@@ -0,0 +1,12 @@
+# tests/conftest.py
+
+import pytest
+
+import config.config as cfg
+
+
+@pytest.fixture(autouse=True)
+def isolated_snapshot_cache(tmp_path, monkeypatch):
+    """Keep the Excel snapshot cache (and its signing key) inside each test's tmp_path."""
+    monkeypatch.setattr(cfg, 'SNAPSHOT_CACHE_DIR', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(cfg, 'CACHE_KEY_FILE', str(tmp_path / 'cache.key'))
@@ -1,7 +1,9 @@
 # tests/test_claim.py
 
 import pandas as pd
+import pytest
 from src.processing.claim import enrich_claim_data
+from src.utils.date_utils import generate_weeks_range_monday, render_weeks_range
 
 def test_enrich_claim_data_minimal():
     # One promotion with known SPMS mapping
@@ -45,6 +47,104 @@ def test_enrich_claim_data_minimal():
     # Short name is first 12 uppercase chars
     assert enriched.at[0, 'Bill To Name Short']   == 'CUSTOMERNAME'
 
-    # Week’s range is a non-empty string
-    wr = enriched.at[0, "Week's range"]
-    assert isinstance(wr, str) and len(wr) > 0
+    # Promotion window carried as week ordinals, rendered as labels on export
+    assert enriched.at[0, 'Week End Ordinal'] - enriched.at[0, 'Week Start Ordinal'] == 2
+    wr = render_weeks_range(enriched).at[0, "Week's range"]
+    assert wr == ', '.join(generate_weeks_range_monday('20210101', '20210114'))
+
+
+@pytest.mark.parametrize('schema_dtypes', [False, True])
+@pytest.mark.parametrize('int_dates', [False, True])
+def test_columnar_matches_reference(int_dates, schema_dtypes):
+    from src.processing.claim import enrich_claim_data_columnar
+    from src.utils.lookup import create_lookup_dict
+    import config.config as cfg
+
+    spms_df = pd.DataFrame([
+        {'Promotion No': 1, 'Cancel Flag': 'Y', 'Recreate Flag': 'N',
+         'Promotion Start YYYYMMDD': '20210101', 'Promotion End YYYYMMDD': '20210114',
+         'Bill To Name': 'CURRYS LTD X', 'Product Code': 'P1', 'Sales PGM NO': 'S1'},
+        {'Promotion No': 1, 'Cancel Flag': 'Y', 'Recreate Flag': 'N',
+         'Promotion Start YYYYMMDD': '20210101', 'Promotion End YYYYMMDD': '20210114',
+         'Bill To Name': 'JOHN LEWIS PLC', 'Product Code': 'P2', 'Sales PGM NO': 'S2'},
+        {'Promotion No': 2, 'Cancel Flag': 'N', 'Recreate Flag': 'Y',
+         'Promotion Start YYYYMMDD': 'bad', 'Promotion End YYYYMMDD': '20210114',
+         'Bill To Name': 'AO RETAIL', 'Product Code': 'P3', 'Sales PGM NO': 'S3'},
+    ])
+    if int_dates:
+        # SPMS dates read as int cells; promotion 4 of the claim is not in SPMS
+        for col in ('Promotion Start YYYYMMDD', 'Promotion End YYYYMMDD'):
+            spms_df[col] = pd.to_numeric(spms_df[col], errors='coerce').fillna(0).astype('int64')
+    spms2_df = pd.DataFrame([
+        {'Promotion No': 1, 'Bill To Name': 'AO RETAIL LTD', 'Product Code': 'P9', 'Sales PGM NO': 'R7'},
+    ])
+    if schema_dtypes:
+        # SPMS as loaded under INPUT_SCHEMAS (category names, codes and flags)
+        from src.io.file_ops import apply_schema_dtypes
+        spms_df = apply_schema_dtypes(spms_df, cfg.INPUT_SCHEMAS['SPMS_MAIN'])
+        spms2_df = apply_schema_dtypes(spms2_df, cfg.INPUT_SCHEMAS['SPMS_SECONDARY'])
+    df = pd.DataFrame([
+        {'Promotion No': 1, 'Bill To Name': 'CURRYS LTD XYZ', 'Product Code': 'P2'},
+        {'Promotion No': 1, 'Bill To Name': 'AO RETAIL LTD', 'Product Code': 'P9'},
+        {'Promotion No': 1, 'Bill To Name': 'NOBODY', 'Product Code': 'PX'},
+        {'Promotion No': 2, 'Bill To Name': 'AO RETAIL', 'Product Code': 'P3'},
+        {'Promotion No': 4, 'Bill To Name': 'X', 'Product Code': 'P1'},
+    ])
+
+    expected = enrich_claim_data(
+        df,
+        create_lookup_dict(spms_df, 'Promotion No', cfg.SPMS_FIELDS),
+        create_lookup_dict(spms2_df, 'Promotion No', cfg.SPMS2_FIELDS),
+    )
+    result = enrich_claim_data_columnar(df, spms_df, spms2_df)
+
+    assert list(result.columns) == list(expected.columns)
+    for col in expected.columns:
+        assert result[col].astype(str).tolist() == expected[col].astype(str).tolist(), col
+
+    # Report 7 fallback resolved the customer Report 1 does not carry
+    assert result.at[1, 'Bill To Name SPMS'] == 'AO RETAIL LTD'
+    assert result.at[1, 'Sales PGM NO'] == 'R7'
+    assert result.at[0, 'Promotion Start Week'] == 53
+    assert result.at[0, 'Promotion Start Year'] == 2021
+    assert result.at[0, 'Week End Ordinal'] - result.at[0, 'Week Start Ordinal'] == 2
+
+
+def test_resolve_promotion_chains():
+    from src.processing.claim import resolve_promotion_chains
+
+    spms_df = pd.DataFrame({
+        'Promotion No':          [100, 101, 101, 102, 200],
+        'Original Promotion No': [None, 100, 100, 101.0, None],
+        'Cancel Flag':           ['Y', 'Y', 'Y', 'N', 'N'],
+    })
+    claim = pd.DataFrame({'Promotion No': [100, 102, 200, 999]})
+
+    out = resolve_promotion_chains(claim, spms_df)
+
+    # 100 was cancelled and recreated as 101, then again as 102; the claim's
+    # int promotion numbers stay ints (missing as <NA>)
+    assert str(out['Root Promotion No'].dtype) == 'Int64'
+    assert out['Root Promotion No'].tolist() == [100, 100, 200, pd.NA]
+    assert out['Live Promotion No'].tolist() == [102, 102, 200, pd.NA]
+
+
+def test_promotion_chains_order_and_recreate_flag():
+    from src.processing.claim import resolve_promotion_chains
+
+    # Neither SPMS row order nor promotion number is chain order: 'P2' starts
+    # after 'P3'. 'P9' names P1 as original but is not a recreation, so it is
+    # not part of the chain.
+    spms_df = pd.DataFrame({
+        'Promotion No':             ['P2', 'P1', 'P3', 'P9'],
+        'Original Promotion No':    ['P1', None, 'P1', 'P1'],
+        'Recreate Flag':            ['Y', 'N', 'Y', 'N'],
+        'Cancel Flag':              ['N', 'Y', 'N', 'N'],
+        'Promotion Start YYYYMMDD': [20210301, 20210101, 20210201, 20210401],
+    })
+    claim = pd.DataFrame({'Promotion No': ['P1', 'P3', 'P9', 'X']})
+
+    out = resolve_promotion_chains(claim, spms_df)
+
+    assert out['Root Promotion No'].tolist() == ['P1', 'P1', 'P9', '']
+    assert out['Live Promotion No'].tolist() == ['P2', 'P2', 'P9', '']
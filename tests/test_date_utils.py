@@ -22,3 +22,42 @@ def test_generate_weeks_range_monday():
     assert any("W2" in w for w in weeks)
     # And exactly two entries
     assert len(weeks) == 2
+
+def test_batch_date_conversions():
+    import pandas as pd
+    from src.utils.date_utils import dates_to_weeks, dates_to_years, week_start_mondays
+
+    values = pd.Series(["20210101", 20210415, "bad", None])
+    assert dates_to_weeks(values).tolist() == [53, 15, 0, 0]
+    assert dates_to_years(values).tolist() == [2021, 2021, 0, 0]
+    assert dates_to_years(values, iso=True).tolist() == [2020, 2021, 0, 0]
+
+    mondays = week_start_mondays(values)
+    assert mondays[0] == pd.Timestamp("2020-12-28")
+    assert mondays[1] == pd.Timestamp("2021-04-12")
+    assert mondays[2:].isna().all()
+
+def test_week_ordinals_round_trip_labels():
+    import pandas as pd
+    from src.utils.date_utils import week_ordinals, week_range_labels, week_label_to_ordinal
+
+    start, end = week_ordinals(pd.Series(["20210101", "20210114"]))
+    labels = week_range_labels(start, end)
+    assert labels == generate_weeks_range_monday("20210101", "20210114")
+    assert [week_label_to_ordinal(l) for l in labels] == list(range(start, end + 1))
+    assert week_label_to_ordinal("Model.Suffix") is None
+    # Date headers and non-Monday labels are not week columns
+    assert week_label_to_ordinal(pd.Timestamp("2021-01-06")) is None
+    assert week_label_to_ordinal("21-01-06\n(W1)") is None
+
+
+def test_excel_dates_reads_serials_and_text():
+    import pandas as pd
+    from src.utils.date_utils import excel_dates
+
+    out = excel_dates([44200, 44200.75, '2021-01-05', None, pd.Timestamp('2021-01-06')])
+
+    assert out[0] == pd.Timestamp('2021-01-04')
+    assert out[1] == pd.Timestamp('2021-01-04 18:00')
+    assert out[3] is pd.NaT
+    assert out[4] == pd.Timestamp('2021-01-06')
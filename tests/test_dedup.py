@@ -0,0 +1,43 @@
+# tests/test_dedup.py
+
+import pandas as pd
+from src.processing.dedup import enrich_by_unique_keys
+from src.processing.tracker import enrich_tracker_data
+
+def test_enrich_by_unique_keys_broadcasts():
+    df = pd.DataFrame({
+        'K1': ['a', 'b', 'a', None, None],
+        'K2': [1, 1, 1, 2, 2],
+        'Other': [10, 20, 30, 40, 50],
+    })
+    seen = []
+
+    def enrich(frame):
+        seen.append(len(frame))
+        out = frame.copy()
+        out['Key'] = out['K1'].fillna('-') + out['K2'].astype(str)
+        return out
+
+    out = enrich_by_unique_keys(df, ['K1', 'K2'], enrich, ['Key'])
+
+    assert seen == [3]  # ('a',1), ('b',1), (None,2)
+    assert out['Key'].tolist() == ['a1', 'b1', 'a1', '-2', '-2']
+    assert out['Other'].tolist() == df['Other'].tolist()
+
+def test_tracker_dedup_matches_rowwise():
+    claim = pd.DataFrame({
+        'Bill To Name Short': ['CUSTX', 'CUSTX', 'CUSTY'],
+        'Product Code SPMS': ['P1', 'P1', 'P1'],
+        'Q': [1, 2, 3],
+    })
+    tracker = pd.DataFrame({
+        'Customer': ['CustX Ltd', 'CustY Ltd', 'CustX Ltd'],
+        'Model': ['P1', 'P1', 'P1'],
+        'Claim Volume': [4, 5, 6],
+    })
+
+    rowwise = enrich_tracker_data(claim, tracker)
+    dedup = enrich_tracker_data(claim, tracker, dedup=True)
+
+    pd.testing.assert_frame_equal(rowwise, dedup)
+    assert dedup['Tracker'].tolist() == [10, 10, 5]
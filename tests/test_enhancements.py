@@ -0,0 +1,40 @@
+# tests/test_enhancements.py
+
+import pandas as pd
+import pytest
+import openpyxl
+
+from src.output.enhancements import add_closed_orders_by_year
+from src.processing.orders import merge_closed_orders
+
+
+@pytest.mark.parametrize('store', [False, True])
+def test_add_closed_orders_by_year_uses_detail(tmp_path, store):
+    claim_df = pd.DataFrame({
+        'Bill To Name Short': ['CUST1', 'CUST2'],
+        'Product Code SPMS': ['M1', 'M1'],
+    })
+    files = []
+    for year in ('2021', '2022'):
+        path = tmp_path / f"{year} CLOSED ORDERS.xlsx"
+        pd.DataFrame({'Order No': ['A1', 'A2', 'A3'],
+                      'Bill To Name': ['Cust1', 'Cust2', 'Cust1'], 'Model': ['M1', 'M1', 'M1'],
+                      'Order Qty': [1, 2, 3],
+                      'Order Date': [pd.Timestamp(f'{year}-03-01'), pd.Timestamp(f'{year}-01-01'),
+                                     pd.Timestamp(f'{year}-01-01')]}).to_excel(path, index=False)
+        files.append(str(path))
+    _, detail = merge_closed_orders(claim_df, files, return_detail=True,
+                                    store_dir=str(tmp_path / "store") if store else None)
+
+    workbook = tmp_path / "bebs.xlsx"
+    subset = claim_df.iloc[[0]]
+    subset.to_excel(workbook, index=False, sheet_name='VERIFICATION')
+    add_closed_orders_by_year(str(workbook), subset, closed_orders=detail)
+
+    assert openpyxl.load_workbook(workbook).sheetnames == [
+        'VERIFICATION', 'Closed Orders 2021', 'Closed Orders 2022']
+    sheet = pd.read_excel(workbook, sheet_name='Closed Orders 2021')
+    # raw order lines, all source columns, in file order
+    assert sheet['Order No'].tolist() == ['A1', 'A3']
+    assert sheet['Bill To Name Short'].tolist() == ['CUST1', 'CUST1']
+    assert sheet['Order Qty'].tolist() == [1, 3]
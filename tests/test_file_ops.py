@@ -0,0 +1,173 @@
+# tests/test_file_ops.py
+
+import pandas as pd
+import pytest
+
+from src.io.file_ops import MissingColumnsError, read_excel_filtered
+
+
+def test_read_excel_filtered_projects_and_filters_rows(tmp_path):
+    path = tmp_path / "orders.xlsx"
+    pd.DataFrame({
+        'Bill To Name': ['Cust1', 'Other', 'Cust1'],
+        'Unused': ['a', 'b', 'c'],
+        'Model': ['M1', 'M1', 'M2'],
+        'Order Qty': [10, 5, 7],
+    }).to_excel(path, index=False)
+
+    df = read_excel_filtered(
+        str(path), ['Model', 'Order Qty'],
+        row_filter=lambda values: values[0] == 'M1'
+    )
+
+    assert list(df.columns) == ['Model', 'Order Qty']
+    assert df['Order Qty'].tolist() == [10, 5]
+
+
+def test_read_excel_filtered_reports_missing_columns(tmp_path):
+    path = tmp_path / "orders.xlsx"
+    pd.DataFrame({'Customer': ['Cust1'], 'Qty': [1]}).to_excel(path, index=False)
+
+    with pytest.raises(MissingColumnsError, match="Order Qty"):
+        read_excel_filtered(str(path), ['Customer', 'Order Qty'])
+
+
+def test_excel_source_reads_several_sheets_from_one_handle(tmp_path):
+    from src.io.file_ops import ExcelSource
+
+    path = tmp_path / "book.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'A': [1, 2]}).to_excel(writer, sheet_name='First', index=False)
+        pd.DataFrame([['title', None], ['B', 'C'], [3, 4]]).to_excel(
+            writer, sheet_name='Second', index=False, header=False)
+
+    with ExcelSource(str(path)) as source:
+        assert source.sheet_names == ['First', 'Second']
+        frames = source.read_sheets({'First': None, 'Second': {'header': 1}})
+        assert source.read('Missing')['A'].tolist() == [1, 2]
+        with pytest.raises(ValueError):
+            source.read_sheets({'Missing': None})
+        rows = list(source.iter_rows('Second'))
+
+    assert frames['First']['A'].tolist() == [1, 2]
+    assert frames['Second'].columns.tolist() == ['B', 'C']
+    assert rows[2] == (3, 4)
+
+
+def test_read_spms_reports_applies_each_sheet_skiprows(tmp_path):
+    from src.io.file_ops import read_spms_reports
+
+    path = tmp_path / "SPMS.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame([['t', None, None, None], ['t', None, None, None], ['t', None, None, None],
+                      ['Promotion No', 'Extra', 'Bill To Name', 'Expected Qty'],
+                      ['P1', 'x', 'CUST', 5]]).to_excel(
+            writer, sheet_name='Report 1', index=False, header=False)
+        pd.DataFrame([['t', None, None], ['t', None, None],
+                      ['Promotion No', 'Extra', 'Expected Qty'], ['P2', 'y', 2.5]]).to_excel(
+            writer, sheet_name='Report 7', index=False, header=False)
+
+    spms_df, spms2_df = read_spms_reports(str(path))
+
+    # the main report is exported whole, so it is checked but not projected
+    assert spms_df.columns.tolist() == ['Promotion No', 'Extra', 'Bill To Name', 'Expected Qty']
+    assert spms_df['Promotion No'].tolist() == ['P1']
+    assert spms2_df.columns.tolist() == ['Promotion No', 'Expected Qty']
+    assert spms2_df['Promotion No'].tolist() == ['P2']
+    # compact dtypes; a fractional quantity falls back to float64
+    assert isinstance(spms_df['Bill To Name'].dtype, pd.CategoricalDtype)
+    assert str(spms_df['Expected Qty'].dtype) == 'Int32'
+    assert spms2_df['Expected Qty'].dtype == 'float64'
+
+
+def test_excel_source_schema_projects_and_casts(tmp_path):
+    import config.config as cfg
+    from src.io.file_ops import ExcelSource
+    from src.processing.psi import enrich_psi_data
+    from src.utils.date_utils import week_label_to_ordinal
+
+    week1, week2 = '21-01-04\n(W1)', '21-01-11\n(W2)'
+    path = tmp_path / "PSI.xlsx"
+    pd.DataFrame([
+        ['Cust A', 'P1', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 'note', 1, 2, 99],
+        ['Cust A', 'P1', 'Sell-In FCST_KAM [R+F]', 0, 0, 0, 'note', 3, 4, 99],
+    ], columns=['Channel', 'Model.Suffix', 'Measure', 'M1', 'M2', 'M3', 'Notes',
+                week1, week2, 'Total']).to_excel(path, index=False)
+
+    with ExcelSource(str(path)) as source:
+        full = source.read()
+        psi_df = source.read(schema=cfg.INPUT_SCHEMAS['PSI_FILE'])
+
+    assert psi_df.columns.tolist() == ['Channel', 'Model.Suffix', 'Measure', 'M1', 'M2', 'M3',
+                                       week1, week2]
+    assert psi_df['Measure'].dtype == 'category'
+    assert psi_df[week1].dtype == 'float64'
+
+    start = week_label_to_ordinal(week1)
+    claim_df = pd.DataFrame([{'Bill To Name Short': 'CUST', 'Product Code SPMS': 'P1',
+                              'Week Start Ordinal': start, 'Week End Ordinal': start + 1}])
+    pd.testing.assert_frame_equal(enrich_psi_data(claim_df, psi_df),
+                                  enrich_psi_data(claim_df, full))
+
+    with pytest.raises(MissingColumnsError, match="Region"):
+        with ExcelSource(str(path)) as source:
+            source.read(schema={'required': ['Channel', 'Region']})
+
+
+def test_snapshot_cache_serves_repeat_reads_and_invalidates(tmp_path, monkeypatch):
+    import os
+    from src.io.file_ops import ExcelSource, SnapshotCache
+
+    path = tmp_path / "book.xlsx"
+    pd.DataFrame({'A': [1, 2]}).to_excel(path, index=False)
+    cache = SnapshotCache(str(tmp_path / "cache"), max_bytes=10**9)
+
+    with ExcelSource(str(path), cache=cache) as source:
+        first = source.read()
+    assert len(cache.entries()) == 1
+    assert cache.entries()[0]['source'] == os.path.abspath(path)
+
+    # A hit never opens the workbook
+    with monkeypatch.context() as m:
+        m.setattr(pd, 'ExcelFile', None)
+        with ExcelSource(str(path), cache=cache) as source:
+            pd.testing.assert_frame_equal(source.read(), first)
+
+    # New content → new key, parsed again
+    pd.DataFrame({'A': [3]}).to_excel(path, index=False)
+    assert ExcelSource(str(path), cache=cache).read()['A'].tolist() == [3]
+    assert len(cache.entries()) == 2
+
+    # Invalidation is by path: an identical copy keeps its snapshot
+    copy = tmp_path / "copy.xlsx"
+    copy.write_bytes(path.read_bytes())
+    ExcelSource(str(copy), cache=cache).read()
+    assert cache.invalidate(str(path)) == 2
+    assert [e['source'] for e in cache.entries()] == [os.path.abspath(copy)]
+    assert cache.clear() == 1
+    assert cache.entries() == []
+
+
+def test_snapshot_cache_rejects_tampered_snapshots(tmp_path):
+    import os
+    import pickle
+    from src.io.file_ops import SnapshotCache
+
+    cache = SnapshotCache(str(tmp_path / "cache"), max_bytes=10**9)
+    cache.put('a', pd.DataFrame({'A': [1]}))
+    snapshot = os.path.join(cache.root, 'a' + cache.SUFFIX)
+    with open(snapshot, 'wb') as fh:
+        fh.write(b'\0' * 32 + pickle.dumps(pd.DataFrame({'A': [2]})))
+
+    assert cache.get('a') is None
+    assert not os.path.exists(snapshot)
+
+
+def test_snapshot_cache_evicts_least_recently_used(tmp_path):
+    from src.io.file_ops import SnapshotCache
+
+    cache = SnapshotCache(str(tmp_path / "cache"), max_bytes=0)
+    cache.put('a', pd.DataFrame({'A': [1]}))
+    cache.put('b', pd.DataFrame({'A': [2]}))
+
+    assert [e['key'] for e in cache.entries()] == ['b']
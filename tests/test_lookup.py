@@ -20,3 +20,67 @@ def test_create_and_lookup():
     # lookup_customer with existing name
     val = lookup_customer(1, 'FieldA', lookup, customer_name='Customer1')
     assert val == 'X'
+
+
+def test_spms_index_matches_linear_lookups():
+    from src.utils.lookup import SpmsIndex, lookup_customer2, lookup_SPGM
+
+    df = make_df()
+    fields = ['FieldA', 'Bill To Name', 'Product Code']
+    primary = create_lookup_dict(df, 'Promotion No', fields)
+    secondary = create_lookup_dict(
+        pd.DataFrame([{'Promotion No': 2, 'FieldA': 'S', 'Bill To Name': 'Other', 'Product Code': 'P9'}]),
+        'Promotion No', fields
+    )
+    index = SpmsIndex(primary, secondary)
+
+    for promo, name in [(1, 'Customer2'), (1, 'Cust'), (2, 'Oth'), (2, 'Nobody'), (3, 'Customer1')]:
+        assert index.lookup_customer(promo, 'FieldA', name) == \
+            lookup_customer(promo, 'FieldA', primary, customer_name=name, secondary_lookup_dict=secondary)
+    for promo, code in [(1, 'P2'), (2, 'P9'), (2, 'P1'), (1, '')]:
+        assert index.lookup_product(promo, 'FieldA', code) == \
+            lookup_customer2(promo, 'FieldA', primary, product_code=code, secondary_lookup_dict=secondary)
+    assert index.lookup_spgm(2, 'Other') == lookup_SPGM(2, 'Other', primary, secondary)
+
+    hit = index.lookup_all(1, 'Customer2', 'P1')
+    assert hit['Bill To Name SPMS'] == 'Customer2'
+    assert hit['Product Code SPMS'] == 'P1'
+    assert index.lookup_all(999) is None
+
+
+def test_spms_index_lookup_all_matches_single_probes():
+    from src.utils.lookup import SpmsIndex
+
+    fields = ['Bill To Name', 'Product Code', 'Sales PGM NO']
+    primary = create_lookup_dict(pd.DataFrame([
+        {'Promotion No': 1, 'Bill To Name': 'LONGCUSTOMERA Ltd', 'Product Code': 'P1', 'Sales PGM NO': 'S1'},
+        {'Promotion No': 1, 'Bill To Name': 'LONGCUSTOMERB', 'Product Code': 'P2', 'Sales PGM NO': 'S2'},
+    ]), 'Promotion No', fields)
+    # Only the secondary report holds the full name: the 12-char prefix is
+    # answered from the primary, the full name falls back to the secondary
+    secondary = create_lookup_dict(pd.DataFrame([
+        {'Promotion No': 1, 'Bill To Name': 'LONGCUSTOMERC GmbH', 'Product Code': 'P3', 'Sales PGM NO': 'S3'},
+    ]), 'Promotion No', fields)
+    index = SpmsIndex(primary, secondary)
+
+    for customer in ['LONGCUSTOMERB', 'LONGCUSTOMERC GmbH', 'LONGCUSTOMERA', 'X', '']:
+        hit = index.lookup_all(1, customer, 'P2')
+        assert hit['Bill To Name SPMS'] == index.lookup_customer(1, 'Bill To Name', customer[:12])
+        assert hit['Sales PGM NO'] == index.lookup_spgm(1, customer)
+        assert hit['Product Code SPMS'] == 'P2'
+
+
+def test_lookup_store_matches_dict():
+    from src.utils.lookup import create_lookup_store
+
+    df = make_df()
+    fields = ['FieldA', 'Bill To Name', 'Product Code']
+    as_dict = create_lookup_dict(df, 'Promotion No', fields)
+    store = create_lookup_store(df, 'Promotion No', fields)
+
+    assert set(store) == set(as_dict)
+    assert {k: [dict(r) for r in v] for k, v in store.items()} == as_dict
+    assert lookup_value(1, 'FieldA', store) == 'X'
+    assert lookup_value(999, 'FieldA', store, default='NOT') == 'NOT'
+    assert lookup_customer(1, 'FieldA', store, customer_name='Customer2') == 'Y'
+    assert store.column(1, 'Bill To Name') == ['Customer1', 'Customer2']
@@ -0,0 +1,56 @@
+# tests/test_order_store.py
+
+import os
+import pandas as pd
+
+from src.io.order_store import OrderAggregateStore
+
+
+def test_store_roundtrip_and_invalidation(tmp_path):
+    source = tmp_path / "2021 CLOSED.xlsx"
+    source.write_bytes(b"version one")
+    store = OrderAggregateStore(str(tmp_path / "store"))
+    aggregates = {'totals': pd.DataFrame({'Bill To Name Short': ['CUST1'],
+                                          'Model': ['M1'], 'Order Qty': [4.0]})}
+
+    assert store.get(str(source)) is None
+    store.put(str(source), aggregates)
+    pd.testing.assert_frame_equal(store.get(str(source))['totals'], aggregates['totals'])
+
+    # Same content, new mtime: still a hit (content hash matches)
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert store.get(str(source)) is not None
+
+    # Changed content: stale
+    source.write_bytes(b"version two")
+    assert store.get(str(source)) is None
+
+
+def test_store_keeps_lines_apart_in_chunks(tmp_path, monkeypatch):
+    import config.config as cfg
+    from src.processing.orders import merge_closed_orders
+
+    monkeypatch.setattr(cfg, 'CLOSED_ORDERS_LINE_CHUNK', 2)
+    path = tmp_path / "2021 CLOSED ORDERS.xlsx"
+    pd.DataFrame({'Bill To Name': ['Cust1', 'Other', 'Cust1', 'Cust1', 'Other'],
+                  'Model': ['M1'] * 5, 'Order Qty': [1, 2, 3, 4, 5],
+                  'Order No': [10, 11, 12, 13, 14]}).to_excel(path, index=False)
+    claim_df = pd.DataFrame([{'Bill To Name Short': 'CUST1', 'Product Code SPMS': 'M1'}])
+    store_dir = str(tmp_path / "store")
+
+    merge_closed_orders(claim_df, [str(path)], store_dir=store_dir)
+    store = OrderAggregateStore(store_dir)
+
+    # The aggregate entry holds no raw lines; they are stored as chunks
+    assert set(store.get(str(path))) == {'totals', 'daily'}
+    chunks = list(store.iter_lines(str(path)))
+    assert [len(c) for c in chunks] == [2, 2, 1]
+
+    _, detail = merge_closed_orders(claim_df, [str(path)], store_dir=store_dir,
+                                    return_detail=True)
+    assert detail.select([('CUST1', 'M1')])['2021']['Order No'].tolist() == [10, 12, 13]
+
+    # An entry whose lines file is gone is stale
+    os.remove(store._lines_path(str(path)))
+    assert store.get(str(path)) is None
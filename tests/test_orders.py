@@ -1,6 +1,7 @@
 # tests/test_orders.py
 
 import pandas as pd
+import pytest
 import os
 from src.processing.orders import merge_closed_orders
 
@@ -29,3 +30,145 @@ def test_merge_closed_orders_with_temp_excel(tmp_path):
 
     # Total Closed Orders should equal the same
     assert result.at[0, 'Total Closed Orders'] == 10
+
+
+def test_merge_closed_orders_parallel_skips_bad_files(tmp_path):
+    claim_df = pd.DataFrame([{'Bill To Name Short': 'CUST1', 'Product Code SPMS': 'M1'}])
+    files = []
+    for year, qty in (('2021', 10), ('2022', 3)):
+        path = tmp_path / f"{year} CLOSED ORDERS.xlsx"
+        pd.DataFrame({'Bill To Name': ['Cust1', 'Cust1'], 'Model': ['M1', 'M2'],
+                      'Order Qty': [qty, 99]}).to_excel(path, index=False)
+        files.append(str(path))
+    broken = tmp_path / "2023 CLOSED ORDERS.xlsx"
+    pd.DataFrame({'Customer': ['Cust1'], 'Qty': [1]}).to_excel(broken, index=False)
+    files.append(str(broken))
+    files.append(str(tmp_path / "2024 missing.xlsx"))
+
+    result = merge_closed_orders(claim_df, files, workers=2)
+
+    assert result.at[0, 'Order Qty 2021'] == 10
+    assert result.at[0, 'Order Qty 2022'] == 3
+    assert 'Order Qty 2023' not in result.columns
+    assert result.at[0, 'Total Closed Orders'] == 13
+
+
+def test_merge_closed_orders_sums_duplicate_years(tmp_path):
+    claim_df = pd.DataFrame({
+        'Bill To Name Short': ['CUST1', 'CUST1', 'CUST2'],
+        'Product Code SPMS': ['M1', 'M2', 'M1'],
+        'Other': [1, 2, 3],
+    })
+    files = []
+    for name, qty in (("2021 CLOSED A.xlsx", 4), ("2021 CLOSED B.xlsx", 6), ("2022 CLOSED.xlsx", 1)):
+        path = tmp_path / name
+        pd.DataFrame({'Bill To Name': ['Cust1', 'Cust2'], 'Model': ['M1', 'M1'],
+                      'Order Qty': [qty, 2 * qty]}).to_excel(path, index=False)
+        files.append(str(path))
+
+    result = merge_closed_orders(claim_df, files)
+
+    assert len(result) == 3
+    assert result['Order Qty 2021'].tolist() == [10, 0, 20]
+    assert result['Order Qty 2022'].tolist() == [1, 0, 2]
+    assert result['Total Closed Orders'].tolist() == [11, 0, 22]
+    assert result['Other'].tolist() == [1, 2, 3]
+
+
+def test_merge_closed_orders_reuses_store(tmp_path, monkeypatch):
+    import src.processing.orders as orders
+
+    claim_df = pd.DataFrame([{'Bill To Name Short': 'CUST1', 'Product Code SPMS': 'M1'}])
+    path = tmp_path / "2021 CLOSED ORDERS.xlsx"
+    pd.DataFrame({'Bill To Name': ['Cust1', 'Cust1', 'Other'], 'Model': ['M1', 'M1', 'M1'],
+                  'Order Qty': [4, 6, 5],
+                  'Order Date': [pd.Timestamp('2021-01-04'), pd.Timestamp('2021-01-04 10:00'),
+                                 pd.Timestamp('2021-02-01')]}
+                 ).to_excel(path, index=False)
+    store_dir = str(tmp_path / "store")
+
+    first = merge_closed_orders(claim_df, [str(path)], store_dir=store_dir)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("file re-parsed")
+    monkeypatch.setattr(orders, 'iter_excel_columns', fail)
+    second = merge_closed_orders(claim_df, [str(path)], store_dir=store_dir)
+
+    assert first.at[0, 'Order Qty 2021'] == second.at[0, 'Order Qty 2021'] == 10
+    daily = orders.OrderAggregateStore(store_dir).get(str(path))['daily']
+    assert daily['Order Qty'].tolist() == [10, 5]
+
+
+def test_order_date_index_window_totals():
+    from src.processing.orders import OrderDateIndex
+
+    daily = pd.DataFrame({
+        'Bill To Name Short': ['CUST1', 'CUST1', 'CUST1', 'CUST2'],
+        'Model': ['M1', 'M1', 'M1', 'M1'],
+        'Order Date': pd.to_datetime(['2021-01-04', '2021-01-10', '2021-02-01', '2021-01-05']),
+        'Order Qty': [4, 6, 5, 100],
+    })
+    index = OrderDateIndex(daily)
+
+    totals = index.window_totals(
+        ['CUST1', 'CUST1', 'CUST1', 'CUST1', 'CUST3'],
+        ['M1', 'M1', 'M1', 'M2', 'M1'],
+        pd.to_datetime(['2021-01-04', '2021-01-05', '2020-01-01', '2021-01-01', '2021-01-01']),
+        pd.to_datetime(['2021-01-10', '2021-03-01', '2020-12-31', '2021-12-31', '2021-12-31']),
+    )
+
+    assert totals.tolist() == [10, 11, 0, 0, 0]
+
+
+def test_merge_closed_orders_promo_window(tmp_path):
+    claim_df = pd.DataFrame({
+        'Bill To Name Short': ['CUST1', 'CUST1'],
+        'Product Code SPMS': ['M1', 'M1'],
+        'Promotion Start Date': ['20210104', 0],
+        'Promotion End Date': ['20210110', 0],
+    })
+    path = tmp_path / "2021 CLOSED ORDERS.xlsx"
+    pd.DataFrame({'Bill To Name': ['Cust1'] * 3, 'Model': ['M1'] * 3, 'Order Qty': [4, 6, 5],
+                  'Order Date': [pd.Timestamp('2021-01-04'), pd.Timestamp('2021-01-10 15:00'),
+                                 pd.Timestamp('2021-01-11')]}).to_excel(path, index=False)
+
+    result = merge_closed_orders(claim_df, [str(path)])
+
+    assert result['Order Qty 2021'].tolist() == [15, 15]
+    assert result['Promo Window Orders'].tolist() == [10, 0]
+
+
+def test_merge_closed_orders_promo_window_with_serial_dates(tmp_path):
+    # .xlsb rows yield date cells as Excel day serials (44200 = 2021-01-04)
+    claim_df = pd.DataFrame({
+        'Bill To Name Short': ['CUST1'],
+        'Product Code SPMS': ['M1'],
+        'Promotion Start Date': ['20210104'],
+        'Promotion End Date': ['20210110'],
+    })
+    path = tmp_path / "2021 CLOSED ORDERS.xlsx"
+    pd.DataFrame({'Bill To Name': ['Cust1'] * 3, 'Model': ['M1'] * 3, 'Order Qty': [4, 6, 5],
+                  'Order Date': [44200, 44206.5, 44207]}).to_excel(path, index=False)
+
+    result = merge_closed_orders(claim_df, [str(path)], store_dir=str(tmp_path / "store"))
+
+    assert result['Promo Window Orders'].tolist() == [10]
+
+
+@pytest.mark.parametrize('use_store', [False, True])
+def test_merge_closed_orders_matches_numeric_and_text_models(tmp_path, use_store):
+    # The file reads Model as int, the claim holds the same codes as text
+    # (and a float from a numeric claim column)
+    claim_df = pd.DataFrame({
+        'Bill To Name Short': ['CUST1', 'CUST1', 'CUST1'],
+        'Product Code SPMS': ['1234', 5678.0, 'M1'],
+    })
+    path = tmp_path / "2021 CLOSED ORDERS.xlsx"
+    pd.DataFrame({'Bill To Name': ['Cust1'] * 3, 'Model': [1234, 5678, 1234],
+                  'Order Qty': [4, 6, 5]}).to_excel(path, index=False)
+
+    result = merge_closed_orders(
+        claim_df, [str(path)], store_dir=str(tmp_path / "store") if use_store else None)
+
+    assert result['Order Qty 2021'].tolist() == [9, 6, 0]
+    assert result['Product Code SPMS'].tolist() == ['1234', 5678.0, 'M1']
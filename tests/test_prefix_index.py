@@ -0,0 +1,14 @@
+# tests/test_prefix_index.py
+
+from src.utils.prefix_index import PrefixIndex
+
+def test_prefix_index_rows_and_matches():
+    index = PrefixIndex(['Currys UK', 'AO Retail', None, 'CURRYS PLC', 'Argos'])
+
+    assert index.rows('CURRYS').tolist() == [0, 3]
+    assert index.rows('A').tolist() == [1, 4]
+    assert index.rows('ZZZ').tolist() == []
+    assert index.rows('').tolist() == [0, 1, 2, 3, 4]
+
+    left, right = index.matches(['AO', 'CURRYS', 'AO', 'NONE'])
+    assert list(zip(left.tolist(), right.tolist())) == [(0, 1), (1, 0), (1, 3), (2, 1)]
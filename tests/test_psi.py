@@ -2,28 +2,129 @@
 
 import pandas as pd
 from src.processing.psi import enrich_psi_data
+from src.utils.date_utils import week_label_to_ordinal
+
+WEEK1 = '21-01-04\n(W1)'
 
 def test_enrich_psi_data_basic():
-    # One claim row with a single week label
+    # One claim row whose window covers the single PSI week
+    week = week_label_to_ordinal(WEEK1)
     claim_df = pd.DataFrame([{
         'Bill To Name Short': 'CUSTSHORT',
         'Product Code SPMS': 'P1',
-        "Week's range": 'WEEK1'
+        'Week Start Ordinal': week,
+        'Week End Ordinal': week,
     }])
 
     # Build PSI DataFrame: 6 metadata cols + 1 weekly col
     data = [
         {'Channel': 'CustShortXYZ', 'Model.Suffix': 'P1', 'Measure': 'Sell-Out FCST_KAM [R+F]',
-         'M1':0,'M2':0,'M3':0, 'WEEK1': 5},
+         'M1':0,'M2':0,'M3':0, WEEK1: 5},
         {'Channel': 'CustShortXYZ', 'Model.Suffix': 'P1', 'Measure': 'Sell-In FCST_KAM [R+F]',
-         'M1':0,'M2':0,'M3':0, 'WEEK1': 10},
+         'M1':0,'M2':0,'M3':0, WEEK1: 10},
         {'Channel': 'CustShortXYZ', 'Model.Suffix': 'P1', 'Measure': 'Ch. Inventory_Sellable',
-         'M1':0,'M2':0,'M3':0, 'WEEK1': 15},
+         'M1':0,'M2':0,'M3':0, WEEK1: 15},
     ]
-    psi_df = pd.DataFrame(data, columns=['Channel','Model.Suffix','Measure','M1','M2','M3','WEEK1'])
+    psi_df = pd.DataFrame(data, columns=['Channel','Model.Suffix','Measure','M1','M2','M3',WEEK1])
 
     out = enrich_psi_data(claim_df, psi_df)
 
     assert out.at[0, 'SELL-OUT']   == 5
     assert out.at[0, 'SELL-IN']    == 10
     assert out.at[0, 'INVENTORY']  == 15
+
+def test_enrich_psi_data_window_and_prefix():
+    week2 = '21-01-11\n(W2)'
+    start = week_label_to_ordinal(WEEK1)
+    claim_df = pd.DataFrame([
+        {'Bill To Name Short': 'CUST', 'Product Code SPMS': 'P1',
+         'Week Start Ordinal': start, 'Week End Ordinal': start + 1},
+        {'Bill To Name Short': 'CUST', 'Product Code SPMS': 'P1',
+         'Week Start Ordinal': start + 1, 'Week End Ordinal': start + 1},
+        {'Bill To Name Short': 'OTHER', 'Product Code SPMS': 'P1',
+         'Week Start Ordinal': start, 'Week End Ordinal': start + 1},
+    ])
+    psi_df = pd.DataFrame([
+        ['Cust A', 'P1', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 1, 2],
+        ['CUST B', 'P1', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 10, 20],
+        ['Cust A', 'P2', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 100, 200],
+    ], columns=['Channel', 'Model.Suffix', 'Measure', 'M1', 'M2', 'M3', WEEK1, week2])
+
+    out = enrich_psi_data(claim_df, psi_df)
+
+    assert out['SELL-OUT'].tolist() == [33, 22, 0]
+    assert out['SELL-IN'].tolist() == [0, 0, 0]
+
+def test_psi_cube_window_sums():
+    from src.processing.psi import PsiCube
+
+    start = week_label_to_ordinal(WEEK1)
+    labels = ['21-01-11\n(W2)', WEEK1, '21-01-18\n(W3)']  # header order need not be sorted
+    psi_df = pd.DataFrame([
+        ['Cust A', 'P1', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 2, 1, 4],
+        ['Cust A', 'P1', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 20, 10, None],
+        ['Cust A', 'P1', 'Sell-In FCST_KAM [R+F]', 0, 0, 0, 200, 100, 400],
+    ], columns=['Channel', 'Model.Suffix', 'Measure', 'M1', 'M2', 'M3'] + labels)
+
+    cube = PsiCube(psi_df, ['Sell-Out FCST_KAM [R+F]', 'Sell-In FCST_KAM [R+F]'])
+
+    assert len(cube.pairs) == 1
+    sums = cube.window_sums([0, 0, 0], [start, start + 1, start - 5], [start + 2, start + 1, start])
+    assert sums.tolist() == [[37, 700], [22, 200], [11, 100]]
+
+def test_enrich_psi_data_configured_measures():
+    week = week_label_to_ordinal(WEEK1)
+    claim_df = pd.DataFrame([{
+        'Bill To Name Short': 'CUST', 'Product Code SPMS': 'P1',
+        'Week Start Ordinal': week, 'Week End Ordinal': week,
+    }])
+    psi_df = pd.DataFrame([
+        ['Cust A', 'P1', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 5],
+        ['Cust A', 'P1', 'Ch. Inventory_Total', 0, 0, 0, 7],
+    ], columns=['Channel', 'Model.Suffix', 'Measure', 'M1', 'M2', 'M3', WEEK1])
+
+    out = enrich_psi_data(claim_df, psi_df, measures=[
+        ('Sell-Out FCST_KAM [R+F]', 'SELL-OUT'),
+        ('Ch. Inventory_Total', 'INVENTORY TOTAL'),
+    ])
+
+    assert out.at[0, 'SELL-OUT'] == 5
+    assert out.at[0, 'INVENTORY TOTAL'] == 7
+    assert 'SELL-IN' not in out.columns
+
+def test_enrich_psi_parallel_matches_serial():
+    week = week_label_to_ordinal(WEEK1)
+    claim_df = pd.DataFrame({
+        'Bill To Name Short': ['CUST', 'OTHER', 'CUST', '', 'OTHER'],
+        'Product Code SPMS': ['P1', 'P1', 'P2', 'P1', 'P2'],
+        'Week Start Ordinal': week,
+        'Week End Ordinal': week,
+    }, index=[10, 4, 7, 1, 3])
+    psi_df = pd.DataFrame([
+        ['Cust A', 'P1', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 5],
+        ['Cust A', 'P2', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 6],
+        ['Other', 'P1', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 7],
+        ['Other', 'P2', 'Sell-In FCST_KAM [R+F]', 0, 0, 0, 8],
+    ], columns=['Channel', 'Model.Suffix', 'Measure', 'M1', 'M2', 'M3', WEEK1])
+
+    serial = enrich_psi_data(claim_df, psi_df)
+    parallel = enrich_psi_data(claim_df, psi_df, workers=2)
+
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert parallel['SELL-OUT'].tolist() == [5, 7, 6, 0, 0]
+
+def test_psi_cube_match_probes_within_model():
+    from src.processing.psi import PsiCube
+
+    psi_df = pd.DataFrame(
+        [['Cust A', f'P{i}', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, i] for i in range(50)]
+        + [['Cust B', 'P7', 'Sell-Out FCST_KAM [R+F]', 0, 0, 0, 1]],
+        columns=['Channel', 'Model.Suffix', 'Measure', 'M1', 'M2', 'M3', WEEK1])
+    cube = PsiCube(psi_df, ['Sell-Out FCST_KAM [R+F]'])
+
+    left, pair_ids = cube.match(['CUST', 'CUST A', 'OTHER', 'CUST'], ['P7', 'P7', 'P7', 'X'])
+
+    # Only P7's channels are expanded, never the other 49 models of 'Cust A'
+    assert left.tolist() == [0, 0, 1]
+    assert cube.pairs['_channel'].to_numpy()[pair_ids].tolist() == ['CUST A', 'CUST B', 'CUST A']
+    assert set(cube.pairs['_model'].to_numpy()[pair_ids]) == {'P7'}
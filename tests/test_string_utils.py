@@ -19,3 +19,9 @@ def test_truncate_middle():
     assert len(t) == 10
     # Should contain an ellipsis
     assert '…' in t
+
+def test_code_key():
+    from src.utils.string_utils import code_key
+    assert code_key(1234) == code_key(1234.0) == code_key('1234') == '1234'
+    assert code_key(12.5) == '12.5'
+    assert code_key(None) is None
@@ -29,3 +29,78 @@ def test_enrich_tracker_data_basic():
     assert out.at[0, 'CO CHECK']     == 10 - 4 - 1
     assert out.at[0, 'PSI CHECK']    == 2 - 1
     assert out.at[0, 'ID PSI CHECK'] == (2+3+4) - 1
+
+def test_enrich_tracker_data_prefix_join():
+    claim = pd.DataFrame({
+        'Bill To Name Short': ['CURRYS', 'CURRYS UK', 'AO', 'CURRYS'],
+        'Product Code SPMS': ['P1', 'P1', 'P1', 'P2'],
+        'Q': 0,
+    })
+    tracker = pd.DataFrame({
+        'Customer': ['Currys UK Ltd', 'CURRYS PLC', 'currys uk ltd', 'AO Retail', None],
+        'Model': ['P1', 'P1', 'P1', 'P2', 'P1'],
+        'Claim Volume': [1, 2, '4', 8, 16],
+    })
+
+    out = enrich_tracker_data(claim, tracker)
+
+    assert out['Tracker'].tolist() == [7, 5, 0, 0]
+
+def test_prepared_tracker_select_and_reuse():
+    from src.processing.tracker import PreparedTracker
+
+    raw = pd.DataFrame({
+        'Customer': ['Currys UK Limited', 'AO Retail', 'currys uk limited', None],
+        'Model': ['P1', 'P1', 'P2', 'P1'],
+        'Claim Volume': [3, 5, '7', 1],
+    })
+    prepared = PreparedTracker(raw)
+
+    picked = prepared.select([('CURRYS UK LI', 'P1'), ('CURRYS UK LI', 'P2'), ('NOBODY', 'P1')])
+    assert picked.index.tolist() == [0, 2]
+    assert picked['Customer Short'].tolist() == ['CURRYS UK LI', 'CURRYS UK LI']
+
+    claim = pd.DataFrame({'Bill To Name Short': ['CURRYS', 'AO'], 'Product Code SPMS': ['P1', 'P1'], 'Q': 0})
+    assert enrich_tracker_data(claim, prepared)['Tracker'].tolist() == [3, 5]
+    assert 'Customer Short' not in raw.columns
+
+def test_ingest_trackers_projects_and_aligns():
+    from src.processing.tracker import ingest_trackers
+
+    ha = pd.DataFrame({'Customer': ['CustX Ltd', None], 'Model': ['P1', 'P2'],
+                       'Claim Volume': [4, 'n/a'], 'Notes': ['x', 'y']})
+    tv = pd.DataFrame({' customer name ': ['CustX Ltd'], 'Model.Suffix': ['P1'],
+                       'Claim Qty': [6], 'Week': [1]})
+    bad = pd.DataFrame({'Customer': ['Y'], 'Other': [1]})
+
+    combined = ingest_trackers({'TRACKER_HA': ha, 'TRACKER_P6_TV': tv, 'NEW_TRACKER_1': bad})
+
+    assert list(combined.columns) == ['Customer', 'Model', 'Claim Volume', 'Source', 'Source Row']
+    assert combined['Source'].tolist() == ['TRACKER_HA', 'TRACKER_HA', 'TRACKER_P6_TV']
+    assert str(combined['Customer'].dtype) == 'category'
+    assert combined['Claim Volume'].dtype == 'float64'
+
+    claim = pd.DataFrame({'Bill To Name Short': ['CUSTX'], 'Product Code SPMS': ['P1'], 'Q': 0})
+    assert enrich_tracker_data(claim, combined).at[0, 'Tracker'] == 10
+
+    # Volumes past 2**24 stay exact (float32 would round 16777217 down)
+    big = ingest_trackers({'TRACKER_HA': pd.DataFrame(
+        {'Customer': ['CustX Ltd'], 'Model': ['P1'], 'Claim Volume': [16777217]})})
+    assert enrich_tracker_data(claim, big).at[0, 'Tracker'] == 16777217
+
+
+def test_prepared_tracker_select_returns_full_source_rows():
+    from src.processing.tracker import PreparedTracker, ingest_trackers
+
+    ha = pd.DataFrame({'Customer': ['CustX Ltd', 'Other'], 'Model': ['P1', 'P1'],
+                       'Claim Volume': [4, 1], 'Notes': ['keep me', 'y']})
+    tv = pd.DataFrame({'Customer Name': ['CustX Ltd'], 'Model.Suffix': ['P1'],
+                       'Claim Qty': [6], 'Week': [1]})
+    parts = {'TRACKER_HA': ha, 'TRACKER_P6_TV': tv}
+    prepared = PreparedTracker(ingest_trackers(parts), sources=parts)
+
+    picked = prepared.select([('CUSTX LTD', 'P1')])
+
+    assert picked['Notes'].tolist()[0] == 'keep me'
+    assert picked['Week'].tolist()[1] == 1
+    assert picked['Customer Short'].tolist() == ['CUSTX LTD', 'CUSTX LTD']